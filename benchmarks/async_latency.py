@@ -0,0 +1,76 @@
+"""Fast-query latency while slow queries are in flight, blocking vs. offloaded.
+
+"blocking" runs the transaction directly inside the coroutine, the way the
+handlers did before the data layer moved onto a thread pool; "offload" awaits
+run_in_transaction(). Usage:
+
+    python -m benchmarks.async_latency --requests 400 --slow-ratio 0.05 --slow-seconds 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from dbs_assignment.database import _call_in_transaction, _fetch_one, close_pool, run_in_transaction
+from dbs_assignment.queries import registry
+
+FAST = registry.register('benchmark_fast', "SELECT 1")
+SLOW = registry.register('benchmark_slow', "SELECT pg_sleep(%(seconds)s)")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def one_request(mode, slow, slow_seconds):
+    query, params = (SLOW, {'seconds': slow_seconds}) if slow else (FAST, None)
+    if mode == "blocking":
+        _call_in_transaction(_fetch_one, query, params)
+    else:
+        await run_in_transaction(_fetch_one, query, params)
+
+
+async def run(mode, args):
+    rng = random.Random(args.seed)
+    kinds = [rng.random() < args.slow_ratio for _ in range(args.requests)]
+
+    async def delayed(i):
+        # Latency is measured from the scheduled arrival, so time spent waiting
+        # for a blocked event loop counts against the request.
+        arrival = start + i * args.interval
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        await one_request(mode, kinds[i], args.slow_seconds)
+        return kinds[i], time.perf_counter() - arrival
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(delayed(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    fast = [latency * 1000 for slow, latency in results if not slow]
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "elapsed_s": round(elapsed, 3),
+        "fast_p50_ms": round(percentile(fast, 50), 2),
+        "fast_p99_ms": round(percentile(fast, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    parser.add_argument("--slow-seconds", type=float, default=0.2)
+    parser.add_argument("--interval", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = [asyncio.run(run(mode, args)) for mode in ("blocking", "offload")]
+    close_pool()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Fire N parallel rentals at one publication and check every loan got its own copy.
+
+Seeds a user and a publication with --copies physical instances, then posts
+--rentals concurrent POST /rentals requests through the ASGI app in-process.
+Usage:
+
+    python -m benchmarks.concurrent_rentals --copies 200 --rentals 250 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from dbs_assignment.__main__ import app
+from dbs_assignment.database import close_pool, get_cursor
+
+
+def seed(copies):
+    user_id, publication_id = uuid.uuid4(), uuid.uuid4()
+    with get_cursor() as cur:
+        cur.execute("""
+                    INSERT INTO users VALUES (%(id)s, %(id)s, 'Bench', 'User', %(email)s, '2000-01-01', now(), now())
+                    """, {'id': str(user_id), 'email': '{}@bench.local'.format(user_id.hex[:12])})
+        cur.execute("INSERT INTO publications VALUES (%s, 'Concurrent rentals', now(), now())",
+                    (str(publication_id),))
+        cur.execute("""
+                    INSERT INTO publication_instances
+                    SELECT gen_random_uuid(), %s, 'Bench', 'physical', 'available', 2000, now(), now()
+                    FROM generate_series(1, %s)
+                    """, (str(publication_id), copies))
+    return user_id, publication_id
+
+
+async def run(args, user_id, publication_id):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def rent():
+            async with semaphore:
+                response = await client.post('/rentals', json={'id': str(uuid.uuid4()),
+                                                               'user_id': str(user_id),
+                                                               'publication_id': str(publication_id),
+                                                               'duration': 7})
+                return response.status_code, response.json()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(rent() for _ in range(args.rentals)))
+        return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--copies', type=int, default=200)
+    parser.add_argument('--rentals', type=int, default=250)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    user_id, publication_id = seed(args.copies)
+    results, elapsed = asyncio.run(run(args, user_id, publication_id))
+    close_pool()
+
+    allocated = [body['publication_instance_id'] for status, body in results if status == 201]
+    report = {
+        'rentals': args.rentals,
+        'copies': args.copies,
+        'succeeded': len(allocated),
+        'rejected': sum(1 for status, _ in results if status == 400),
+        'double_allocations': len(allocated) - len(set(allocated)),
+        'expected_successes': min(args.copies, args.rentals),
+        'elapsed_s': round(elapsed, 3),
+        'rentals_per_s': round(args.rentals / elapsed, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""CPU per GET /users/{id} response: Python-side JSON encoding vs. database pass-through.
+
+Seeds a user with --loans rentals and reservations, then builds the same response
+--iterations times per path and reports CPU (all threads) and wall time per request:
+
+- "dicts": the old query; psycopg2 parses the aggregated JSON, jsonable_encoder walks
+  the RealDictRow and JSONResponse encodes it with the stdlib json module.
+- "orjson": the same rows, jsonable_encoder and then ORJSONResponse (the default
+  response class).
+- "orjson_direct": the same rows handed to ORJSONResponse as is, as the row-returning
+  read handlers do.
+- "passthrough": Postgres returns the body as one json text value, sent as is.
+
+Usage:
+
+    python -m benchmarks.json_passthrough --loans 50 --iterations 2000
+"""
+import argparse
+import json
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+from dbs_assignment import queries
+from dbs_assignment.database import _call_in_transaction, _fetch_one, close_pool, get_cursor
+from dbs_assignment.queries import registry
+
+USER_GET_ROWS = registry.register('benchmark_user_get_rows', """
+    WITH sel_user AS (SELECT * FROM users WHERE id=(%(userID)s)),
+    reservations AS (SELECT JSON_AGG(JSON_BUILD_OBJECT('id', reservations.id, 'user_id', reservations.user_id,
+                                                       'publication_id', reservations.publication_id)) AS reservations
+    FROM reservations WHERE reservations.user_id = (%(userID)s)),
+    rentals AS (SELECT JSON_AGG(JSON_BUILD_OBJECT('id', publication_loans.id, 'user_id', publication_loans.user_id,
+                                                  'publication_instance_id', publication_loans.publication_instance_id,
+                                                  'duration', publication_loans.duration,
+                                                  'status', publication_loans.status)) AS rentals
+    FROM publication_loans WHERE publication_loans.user_id = (%(userID)s))
+    SELECT * FROM sel_user, reservations, rentals
+""")
+
+
+def seed(loans):
+    user_id, publication_id = uuid.uuid4(), uuid.uuid4()
+    with get_cursor() as cur:
+        cur.execute("""
+                    INSERT INTO users VALUES (%(id)s, %(id)s, 'Bench', 'User', %(email)s, '2000-01-01', now(), now())
+                    """, {'id': str(user_id), 'email': '{}@bench.local'.format(user_id.hex[:12])})
+        cur.execute("INSERT INTO publications VALUES (%s, 'JSON pass-through', now(), now())",
+                    (str(publication_id),))
+        cur.execute("""
+                    WITH copies AS (
+                      INSERT INTO publication_instances
+                      SELECT gen_random_uuid(), %(publication_id)s, 'Bench', 'physical', 'reserved', 2000, now(), now()
+                      FROM generate_series(1, %(loans)s)
+                      RETURNING id)
+                    INSERT INTO publication_loans (id, user_id, publication_instance_id, start_date, end_date, duration)
+                    SELECT gen_random_uuid(), %(user_id)s, copies.id, now(), now() + interval '7 days', 7
+                    FROM copies
+                    """, {'publication_id': str(publication_id), 'user_id': str(user_id), 'loans': loans})
+        cur.execute("""
+                    INSERT INTO reservations (id, publication_id, user_id, created_at)
+                    SELECT gen_random_uuid(), %(publication_id)s, %(user_id)s, now()
+                    FROM generate_series(1, %(loans)s)
+                    """, {'publication_id': str(publication_id), 'user_id': str(user_id), 'loans': loans})
+    return user_id
+
+
+def dicts(params):
+    row = _call_in_transaction(_fetch_one, USER_GET_ROWS, params)
+    return JSONResponse(jsonable_encoder(row)).body
+
+
+def with_orjson(params):
+    row = _call_in_transaction(_fetch_one, USER_GET_ROWS, params)
+    return ORJSONResponse(jsonable_encoder(row)).body
+
+
+def orjson_direct(params):
+    row = _call_in_transaction(_fetch_one, USER_GET_ROWS, params)
+    return ORJSONResponse(row).body
+
+
+def passthrough(params):
+    row = _call_in_transaction(_fetch_one, queries.USER_GET, params)
+    return Response(content=row['body'], media_type="application/json").body
+
+
+def measure(name, build, params, iterations):
+    for _ in range(min(iterations, 50)):
+        build(params)
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        body = build(params)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {
+        'path': name,
+        'body_bytes': len(body),
+        'cpu_us_per_request': round(cpu / iterations * 1e6, 1),
+        'wall_us_per_request': round(wall / iterations * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--loans', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    params = {'userID': str(seed(args.loans))}
+    report = [measure(name, build, params, args.iterations)
+              for name, build in (('dicts', dicts), ('orjson', with_orjson), ('orjson_direct', orjson_direct),
+                                  ('passthrough', passthrough))]
+    close_pool()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
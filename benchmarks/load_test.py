@@ -0,0 +1,253 @@
+"""Drive the API with a weighted mix of library operations and report latency per endpoint.
+
+Seeds a synthetic library (users with cards, authors, categories, publications with
+physical and ebook copies, open loans and reservations) in one transaction, then
+runs --concurrency clients that pick operations by --mix weight until --requests
+have been sent. Requests go through the ASGI app in-process, or to a running
+server with --base-url. Prints throughput and p50/p95/p99 per endpoint as JSON.
+Usage:
+
+    python -m benchmarks.load_test --users 10000 --publications 2000 --requests 20000 --concurrency 32
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --mix users_get=1,publications_get=1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks.async_latency import percentile
+from dbs_assignment.database import close_pool, get_cursor
+
+DEFAULT_MIX = ('users_get=30,publications_get=35,rentals_post=10,reservations_post=10,'
+               'users_patch=5,cards_patch=5,instances_patch=5')
+
+
+def seed(args):
+    """Insert the synthetic library and return the ids the workload draws from."""
+    tag = uuid.uuid4().hex[:8]
+    params = {'tag': tag, 'users': args.users, 'publications': args.publications,
+              'authors': max(1, args.publications // 5), 'categories': 20,
+              'copies': args.copies, 'loans': args.loans, 'reservations': args.reservations}
+
+    with get_cursor() as cur:
+        cur.execute("""
+                    INSERT INTO users
+                    SELECT gen_random_uuid(), 'load-' || %(tag)s || '-' || i, 'Load', 'User ' || i,
+                    'load-' || %(tag)s || '-' || i || '@bench.local', date '1950-01-01' + i %% 20000, now(), now()
+                    FROM generate_series(1, %(users)s) AS i
+                    RETURNING id
+                    """, params)
+        user_ids = [row['id'] for row in cur.fetchall()]
+        params['user_ids'] = user_ids
+
+        cur.execute("""
+                    INSERT INTO cards
+                    SELECT gen_random_uuid(), user_id, md5(user_id::text), 'active', now(), now()
+                    FROM unnest(%(user_ids)s::uuid[]) AS user_id
+                    RETURNING id
+                    """, params)
+        card_ids = [row['id'] for row in cur.fetchall()]
+
+        cur.execute("""
+                    INSERT INTO authors
+                    SELECT gen_random_uuid(), 'Author ' || i, %(tag)s, now(), now()
+                    FROM generate_series(1, %(authors)s) AS i
+                    RETURNING id
+                    """, params)
+        params['author_ids'] = [row['id'] for row in cur.fetchall()]
+
+        cur.execute("""
+                    INSERT INTO categories
+                    SELECT gen_random_uuid(), 'Category ' || %(tag)s || ' ' || i, now(), now()
+                    FROM generate_series(1, %(categories)s) AS i
+                    RETURNING id
+                    """, params)
+        params['category_ids'] = [row['id'] for row in cur.fetchall()]
+
+        cur.execute("""
+                    INSERT INTO publications
+                    SELECT gen_random_uuid(), 'Publication ' || i, now(), now()
+                    FROM generate_series(1, %(publications)s) AS i
+                    RETURNING id
+                    """, params)
+        publication_ids = [row['id'] for row in cur.fetchall()]
+        params['publication_ids'] = publication_ids
+
+        cur.execute("""
+                    INSERT INTO publication_authors (publication_id, author_id)
+                    SELECT publication_id, (%(author_ids)s::uuid[])[1 + (position - 1) %% %(authors)s]
+                    FROM unnest(%(publication_ids)s::uuid[]) WITH ORDINALITY AS p(publication_id, position)
+                    """, params)
+        cur.execute("""
+                    INSERT INTO publication_categories (category_id, publication_id)
+                    SELECT (%(category_ids)s::uuid[])[1 + (position - 1) %% %(categories)s], publication_id
+                    FROM unnest(%(publication_ids)s::uuid[]) WITH ORDINALITY AS p(publication_id, position)
+                    """, params)
+
+        cur.execute("""
+                    INSERT INTO publication_instances
+                    SELECT gen_random_uuid(), publication_id, 'Load Press',
+                    CASE WHEN copy = 0 THEN 'ebook' ELSE 'physical' END, 'available', 2000, now(), now()
+                    FROM unnest(%(publication_ids)s::uuid[]) AS publication_id,
+                    generate_series(0, %(copies)s) AS copy
+                    RETURNING id
+                    """, params)
+        instance_ids = [row['id'] for row in cur.fetchall()]
+
+        cur.execute("""
+                    WITH lent AS (
+                      UPDATE publication_instances
+                      SET status='reserved'
+                      WHERE id IN (
+                        SELECT id FROM publication_instances
+                        WHERE publication_id = ANY(%(publication_ids)s::uuid[])
+                        AND type='physical'
+                        ORDER BY random()
+                        LIMIT %(loans)s)
+                      RETURNING id)
+                    INSERT INTO publication_loans (id, user_id, publication_instance_id, start_date, end_date, duration)
+                    SELECT gen_random_uuid(), (%(user_ids)s::uuid[])[1 + floor(random() * %(users)s)::int], lent.id,
+                    now(), now() + interval '7 days', 7
+                    FROM lent
+                    """, params)
+        cur.execute("""
+                    INSERT INTO reservations (id, publication_id, user_id, created_at)
+                    SELECT gen_random_uuid(),
+                    (%(publication_ids)s::uuid[])[1 + floor(random() * %(publications)s)::int],
+                    (%(user_ids)s::uuid[])[1 + floor(random() * %(users)s)::int],
+                    now()
+                    FROM generate_series(1, %(reservations)s)
+                    """, params)
+
+    return {'users': user_ids, 'cards': card_ids, 'publications': publication_ids, 'instances': instance_ids}
+
+
+def operations(ids, rng):
+    """Map each endpoint name to a function returning (method, path, json body)."""
+    def pick(kind):
+        return str(rng.choice(ids[kind]))
+
+    return {
+        'users_get': lambda: ('GET', '/users/' + pick('users'), None),
+        'publications_get': lambda: ('GET', '/publications/' + pick('publications'), None),
+        'rentals_post': lambda: ('POST', '/rentals', {'id': str(uuid.uuid4()), 'user_id': pick('users'),
+                                                      'publication_id': pick('publications'), 'duration': 7}),
+        'reservations_post': lambda: ('POST', '/reservations', {'id': str(uuid.uuid4()), 'user_id': pick('users'),
+                                                                'publication_id': pick('publications')}),
+        'users_patch': lambda: ('PATCH', '/users/' + pick('users'), {'name': 'Load {}'.format(rng.randrange(1000))}),
+        'cards_patch': lambda: ('PATCH', '/cards/' + pick('cards'), {'status': rng.choice(('active', 'inactive'))}),
+        'instances_patch': lambda: ('PATCH', '/instances/' + pick('instances'),
+                                    {'publisher': 'Load Press {}'.format(rng.randrange(1000))}),
+    }
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+async def run(args, ids):
+    rng = random.Random(args.seed)
+    ops = operations(ids, rng)
+    weights = parse_mix(args.mix)
+    unknown = set(weights) - set(ops)
+    if unknown:
+        raise SystemExit("Unknown endpoints in --mix: {}".format(", ".join(sorted(unknown))))
+    names, cumulative = list(weights), list(weights.values())
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    remaining = args.requests
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        from dbs_assignment.__main__ import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://load', timeout=args.timeout)
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name = rng.choices(names, cumulative)[0]
+            method, path, body = ops[name]()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError as error:
+                status = type(error).__name__
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            statuses[name][status] += 1
+
+    async with client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in names:
+        samples = latencies[name]
+        if not samples:
+            continue
+        endpoints[name] = {
+            'requests': len(samples),
+            'per_s': round(len(samples) / elapsed, 1),
+            'statuses': {str(status): count for status, count in sorted(statuses[name].items(), key=str)},
+            'errors': sum(count for status, count in statuses[name].items()
+                          if not isinstance(status, int) or status >= 500),
+            'p50_ms': round(percentile(samples, 50), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+        }
+    everything = [sample for samples in latencies.values() for sample in samples]
+    return {
+        'requests': len(everything),
+        'concurrency': args.concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(len(everything) / elapsed, 1),
+        'p50_ms': round(percentile(everything, 50), 2),
+        'p95_ms': round(percentile(everything, 95), 2),
+        'p99_ms': round(percentile(everything, 99), 2),
+        'endpoints': endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--publications', type=int, default=2000)
+    parser.add_argument('--copies', type=int, default=3, help="physical copies per publication (plus one ebook)")
+    parser.add_argument('--loans', type=int, default=2000)
+    parser.add_argument('--reservations', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="comma-separated endpoint=weight pairs")
+    parser.add_argument('--base-url', help="benchmark a running server instead of the in-process app")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    seed_started = time.perf_counter()
+    ids = seed(args)
+    seed_seconds = time.perf_counter() - seed_started
+
+    report = asyncio.run(run(args, ids))
+    close_pool()
+    report = {'seed': {'users': args.users, 'publications': args.publications, 'copies': args.copies,
+                       'loans': args.loans, 'reservations': args.reservations,
+                       'elapsed_s': round(seed_seconds, 3)},
+              'mix': parse_mix(args.mix), **report}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
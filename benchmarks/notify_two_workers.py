@@ -0,0 +1,77 @@
+"""Cross-worker cache invalidation check with two app processes.
+
+Starts two uvicorn processes on the configured database, warms worker B's
+publication cache, renames the author through worker A and measures how long
+B keeps serving the old document. Usage:
+
+    python -m benchmarks.notify_two_workers --port-a 8001 --port-b 8002
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+
+def start_worker(port):
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'dbs_assignment.__main__:app',
+                             '--port', str(port), '--log-level', 'warning'])
+
+
+def wait_ready(client, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            client.get('/stats/cache')
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("worker did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port-a', type=int, default=8001)
+    parser.add_argument('--port-b', type=int, default=8002)
+    parser.add_argument('--timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    workers = [start_worker(args.port_a), start_worker(args.port_b)]
+    try:
+        a = httpx.Client(base_url='http://127.0.0.1:{}'.format(args.port_a))
+        b = httpx.Client(base_url='http://127.0.0.1:{}'.format(args.port_b))
+        wait_ready(a)
+        wait_ready(b)
+
+        tag = uuid.uuid4().hex[:8]
+        author_id = str(uuid.uuid4())
+        publication_id = str(uuid.uuid4())
+        a.post('/authors', json={'id': author_id, 'name': tag, 'surname': 'before'}).raise_for_status()
+        a.post('/publications', json={'id': publication_id, 'title': tag,
+                                      'authors': [{'name': tag, 'surname': 'before'}],
+                                      'categories': []}).raise_for_status()
+        b.get('/publications/{}'.format(publication_id)).raise_for_status()
+
+        a.patch('/authors/{}'.format(author_id), json={'surname': 'after'}).raise_for_status()
+        start = time.monotonic()
+        while time.monotonic() - start < args.timeout:
+            document = b.get('/publications/{}'.format(publication_id)).json()
+            if document['authors'][0]['surname'] == 'after':
+                break
+            time.sleep(0.005)
+
+        stale_for = time.monotonic() - start
+        print(json.dumps({'propagated': stale_for < args.timeout,
+                          'stale_for_ms': round(stale_for * 1000, 1),
+                          'worker_b_cache': b.get('/stats/cache').json()}, indent=2))
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+
+if __name__ == '__main__':
+    main()
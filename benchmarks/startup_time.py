@@ -0,0 +1,76 @@
+"""Import time of the app in a fresh interpreter, checked against a budget.
+
+Each run imports dbs_assignment.__main__ under ``python -X importtime`` with
+DATABASE_HOST pointed at an unroutable address (TEST-NET-1), so an import that
+tried to reach the database fails the run (or hangs until --timeout). Reports
+the median total import time, the part spent in dbs_assignment's own modules
+and the slowest of them; exits with status 1 when the own-module time is over
+--budget-ms. Usage:
+
+    python -m benchmarks.startup_time --runs 5 --budget-ms 250
+
+Most of the own-module time is FastAPI analysing each route's signature, so it
+scales with the machine more than with our code: a single-core CI box measured
+89-116 ms (median 114). The default budget leaves room for that spread and still
+fails on an import that does real work, such as opening a connection or loading
+data.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PACKAGE = 'dbs_assignment'
+
+
+def import_once(timeout):
+    env = dict(os.environ, DATABASE_HOST='192.0.2.1', DATABASE_PORT='5432', DATABASE_NAME='startup',
+               DATABASE_USER='startup', DATABASE_PASSWORD='startup')
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import dbs_assignment.__main__'],
+                               env=env, capture_output=True, text=True, timeout=timeout)
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    own, total = {}, 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len('import time:'):].split('|'))
+        if module == PACKAGE or module.startswith(PACKAGE + '.'):
+            own[module] = int(self_us)
+        if module == PACKAGE + '.__main__':
+            total = int(cumulative_us)
+    return wall, total, own
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=250.0)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    runs = [import_once(args.timeout) for _ in range(args.runs)]
+    own_ms = statistics.median(sum(own.values()) / 1000 for _, _, own in runs)
+    slowest = sorted(runs[-1][2].items(), key=lambda item: item[1], reverse=True)[:5]
+
+    report = {
+        'runs': args.runs,
+        'process_wall_ms': round(statistics.median(wall * 1000 for wall, _, _ in runs), 1),
+        'import_total_ms': round(statistics.median(total / 1000 for _, total, _ in runs), 1),
+        'import_own_ms': round(own_ms, 1),
+        'budget_ms': args.budget_ms,
+        'slowest_modules_ms': {module: round(us / 1000, 1) for module, us in slowest},
+        'ok': own_ms <= args.budget_ms,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
+from dbs_assignment.config import settings
+from dbs_assignment.database import close_pool
+from dbs_assignment.metrics import MetricsMiddleware
+from dbs_assignment.migrate import ensure_schema
+from dbs_assignment.notify import catalog_listener
+from dbs_assignment.replicas import PrimaryPinMiddleware
 from dbs_assignment.router import router
+from dbs_assignment.slowlog import slow_query_log
+from dbs_assignment.sweeper import overdue_sweeper
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing touches the database at import time; the schema is checked here, once.
+    if settings.MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(ensure_schema)
+    if settings.CATALOG_LISTENER_ENABLED and settings.PUBLICATION_CACHE_SIZE > 0:
+        catalog_listener.start()
+    overdue_sweeper.start()
+    yield
+    await overdue_sweeper.stop()
+    catalog_listener.stop()
+    slow_query_log.stop()
+    close_pool()
 
-app = FastAPI(title="DBS")
+
+app = FastAPI(title="DBS", lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(router)
+
+if settings.DATABASE_REPLICA_HOST is not None:
+    app.add_middleware(PrimaryPinMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
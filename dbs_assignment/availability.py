@@ -0,0 +1,86 @@
+import argparse
+import json
+
+from dbs_assignment import queries
+from dbs_assignment.database import get_cursor
+from dbs_assignment.queries import execute
+
+# The publication_availability counters (kept by the triggers of migration 0010) that
+# disagree with a recount of publication_instances. `python -m dbs_assignment.availability`
+# reports them; `--repair` overwrites them with the recount.
+RECOUNT = """
+    WITH recount AS (
+      SELECT publication_id, type,
+      count(*) FILTER (WHERE status = 'available') AS available,
+      count(*) FILTER (WHERE status = 'reserved') AS reserved
+      FROM publication_instances
+      GROUP BY publication_id, type)
+    SELECT coalesce(recount.publication_id, counts.publication_id) AS publication_id,
+    coalesce(recount.type, counts.type) AS type,
+    counts.available AS counted_available, coalesce(recount.available, 0) AS available,
+    counts.reserved AS counted_reserved, coalesce(recount.reserved, 0) AS reserved
+    FROM recount
+    FULL JOIN publication_availability AS counts
+    ON counts.publication_id = recount.publication_id AND counts.type = recount.type
+    WHERE counts.available IS DISTINCT FROM coalesce(recount.available, 0)
+    OR counts.reserved IS DISTINCT FROM coalesce(recount.reserved, 0)
+    ORDER BY 1, 2
+"""
+
+
+def attach_availability(cur, publications):
+    """Add an ``availability`` dict ({type: {available, reserved}}) to each publication row.
+
+    One primary-key lookup for the whole page, the same shape publications_get embeds.
+    """
+    if not publications:
+        return publications
+
+    execute(cur, queries.PUBLICATIONS_AVAILABILITY,
+            {'publication_ids': [str(publication['id']) for publication in publications]})
+    counts = {}
+    for row in cur.fetchall():
+        counts.setdefault(str(row['publication_id']), {})[row['type']] = {'available': row['available'],
+                                                                         'reserved': row['reserved']}
+    for publication in publications:
+        publication['availability'] = counts.get(str(publication['id']), {})
+    return publications
+
+
+def check_availability(cur, lock: bool = False):
+    """Return the counters that differ from a full recount of publication_instances.
+
+    A plain check is one statement over one snapshot and blocks nobody. With lock (the
+    ``--repair`` path) it first takes a SHARE lock on publication_instances, so copies
+    cannot change between the recount and the repair written from it; writers wait
+    until the repairing transaction commits.
+    """
+    if lock:
+        cur.execute("LOCK TABLE publication_instances IN SHARE MODE")
+    cur.execute(RECOUNT)
+    return cur.fetchall()
+
+
+def repair_availability(cur, mismatches):
+    for row in mismatches:
+        cur.execute("""
+                    INSERT INTO publication_availability (publication_id, type, available, reserved)
+                    SELECT %(publication_id)s, %(type)s, %(available)s, %(reserved)s
+                    WHERE EXISTS (SELECT 1 FROM publications WHERE id = %(publication_id)s)
+                    ON CONFLICT (publication_id, type) DO UPDATE
+                    SET available = EXCLUDED.available, reserved = EXCLUDED.reserved
+                    """, row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repair', action='store_true', help="overwrite wrong counters with the recount")
+    args = parser.parse_args()
+
+    with get_cursor() as cur:
+        mismatches = check_availability(cur, lock=args.repair)
+        if args.repair:
+            repair_availability(cur, mismatches)
+
+    print(json.dumps({'mismatches': len(mismatches), 'repaired': len(mismatches) if args.repair else 0,
+                      'counters': mismatches}, indent=2, default=str))
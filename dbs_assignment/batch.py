@@ -0,0 +1,35 @@
+import json
+from typing import List
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from dbs_assignment.config import settings
+from dbs_assignment.queries import execute
+
+
+def batch_ids(ids: List[UUID]) -> List[str]:
+    """The requested ids as strings, duplicates dropped, checked against BATCH_GET_MAX_IDS."""
+    ids = list(dict.fromkeys(str(row_id) for row_id in ids))
+    if len(ids) > settings.BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail="Too Many Ids")
+    return ids
+
+
+def fetch_batch(cur, query, ids):
+    """Rows of query (a single ``= ANY(%(ids)s::uuid[])`` statement) keyed by id."""
+    if not ids:
+        return {}
+    execute(cur, query, {'ids': ids})
+    return {str(row['id']): row for row in cur.fetchall()}
+
+
+def batch_response(rows: dict, ids) -> dict:
+    return {'items': rows, 'missing': [row_id for row_id in ids if row_id not in rows]}
+
+
+def batch_body(bodies: dict, ids) -> bytes:
+    """batch_response for documents that already are json bytes, spliced in without parsing."""
+    items = b",".join(b'"%s":%s' % (row_id.encode(), bodies[row_id]) for row_id in ids if row_id in bodies)
+    missing = json.dumps([row_id for row_id in ids if row_id not in bodies]).encode()
+    return b'{"items":{%s},"missing":%s}' % (items, missing)
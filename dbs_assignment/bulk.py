@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from tempfile import SpooledTemporaryFile
+
+from fastapi import HTTPException, Request
+
+# Request bodies and COPY buffers stay in memory up to this size, then spill to disk.
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+}
+
+
+def body_format(request: Request) -> str:
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type not in CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Expected text/csv or application/x-ndjson")
+    return CONTENT_TYPES[content_type]
+
+
+async def spool_body(request: Request):
+    """Copy the request body into a spooled temporary file without holding it all in memory."""
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def read_records(spool, fmt: str):
+    """Yield (row_number, record dict or None) from a CSV (with header) or NDJSON body.
+
+    A record of None means the line could not be parsed at all.
+    """
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        for row_number, record in enumerate(csv.DictReader(text), start=1):
+            yield row_number, record
+        return
+
+    row_number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield row_number, record if isinstance(record, dict) else None
+
+
+def copy_rows(cur, table: str, columns, rows):
+    """COPY an iterable of row tuples into table through a spooled CSV buffer."""
+    buffer = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', newline='')
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+    buffer.seek(0)
+    cur.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(table, ', '.join(columns)), buffer)
+    buffer.close()
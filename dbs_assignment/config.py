@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseSettings
 
 
@@ -11,5 +13,43 @@ class Settings(BaseSettings):
     DATABASE_USER: str
     DATABASE_PASSWORD: str
 
+    DATABASE_POOL_MIN_SIZE: int = 1
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_POOL_TIMEOUT: float = 5.0
+
+    # Optional read replica (same user and password). Read-only handlers use it when
+    # DATABASE_REPLICA_HOST is set; port and name default to the primary's.
+    DATABASE_REPLICA_HOST: Optional[str] = None
+    DATABASE_REPLICA_PORT: Optional[int] = None
+    DATABASE_REPLICA_NAME: Optional[str] = None
+    # Seconds to wait for a replica connection before falling back to the primary.
+    DATABASE_REPLICA_CONNECT_TIMEOUT: int = 3
+    # After a connection failure the replica is skipped for this long.
+    DATABASE_REPLICA_RETRY_AFTER: float = 30.0
+    # A client that wrote something reads from the primary for this long.
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # Exports stream on their own connections (to the replica when one is set); this
+    # many may run at once, further ones get 429.
+    EXPORT_MAX_CONCURRENT: int = 2
+
+    # Most ids one :batchGet request may ask for.
+    BATCH_GET_MAX_IDS: int = 100
+
+    MIGRATE_ON_STARTUP: bool = True
+    METRICS_ENABLED: bool = True
+
+    # Statements slower than this are logged (0 turns the slow-query log off).
+    SLOW_QUERY_MS: float = 0.0
+    SLOW_QUERY_EXPLAIN_SAMPLE: float = 0.1
+    SLOW_QUERY_LOG_PATH: str = 'slow_queries.log'
+
+    PUBLICATION_CACHE_SIZE: int = 10000
+    PUBLICATION_CACHE_TTL: float = 300.0
+    CATALOG_LISTENER_ENABLED: bool = True
+
+    OVERDUE_SWEEP_INTERVAL: float = 60.0
+    OVERDUE_SWEEP_BATCH_SIZE: int = 5000
+
 
 settings = Settings()
@@ -0,0 +1,332 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+import psycopg2
+from fastapi import HTTPException
+from psycopg2.pool import ThreadedConnectionPool
+
+from dbs_assignment.config import settings
+from dbs_assignment.metrics import TimedCursor
+from dbs_assignment.queries import PreparingConnection, StalePreparedStatement, execute
+from dbs_assignment.replicas import current_routing
+
+logger = logging.getLogger(__name__)
+
+
+class Pool:
+    """Process-wide connection pool with a bounded wait for a free connection."""
+
+    def __init__(self, min_size: int, max_size: int, timeout: float, **connect_kwargs):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.timeouts = 0
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._pool = ThreadedConnectionPool(min_size, max_size, **connect_kwargs)
+        # psycopg2 closes any connection handed back while more than minconn are idle,
+        # so under concurrency every checkout above min_size would reconnect. min_size
+        # only decides how many are opened up front; keep everything up to max_size.
+        self._pool.minconn = max_size
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            self.timeouts += 1
+            raise HTTPException(status_code=503, detail="Database Unavailable")
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection):
+        try:
+            self._pool.putconn(connection, close=bool(connection.closed))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+    def stats(self):
+        return {'in_use': len(self._pool._used), 'idle': len(self._pool._pool),
+                'max_size': self.max_size, 'timeouts': self.timeouts}
+
+
+_pool = None
+_replica_pool = None
+_pool_lock = threading.Lock()
+# Opening the replica pool can wait out a connect timeout; it has its own lock so that
+# does not hold up the primary pool or the executor.
+_replica_pool_lock = threading.Lock()
+
+
+def connection_kwargs():
+    return dict(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
+                user=settings.DATABASE_USER,
+                password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
+
+
+def replica_connection_kwargs():
+    return dict(connection_kwargs(), host=settings.DATABASE_REPLICA_HOST,
+                port=settings.DATABASE_REPLICA_PORT or settings.DATABASE_PORT,
+                dbname=settings.DATABASE_REPLICA_NAME or settings.DATABASE_NAME,
+                connect_timeout=settings.DATABASE_REPLICA_CONNECT_TIMEOUT)
+
+
+def get_pool() -> Pool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = Pool(settings.DATABASE_POOL_MIN_SIZE, settings.DATABASE_POOL_MAX_SIZE,
+                             settings.DATABASE_POOL_TIMEOUT, connection_factory=PreparingConnection,
+                             **connection_kwargs())
+    return _pool
+
+
+def pool_stats():
+    """Stats of the primary pool for /metrics, without creating it (and connecting) if unused.
+
+    Calls turned away by Admission count as pool timeouts.
+    """
+    pool = _pool
+    if pool is None:
+        stats = {'in_use': 0, 'idle': 0, 'max_size': settings.DATABASE_POOL_MAX_SIZE, 'timeouts': 0}
+    else:
+        stats = pool.stats()
+    stats['timeouts'] += admission.timeouts
+    return stats
+
+
+def get_replica_pool() -> Pool:
+    global _replica_pool
+    if _replica_pool is None:
+        with _replica_pool_lock:
+            if _replica_pool is None:
+                _replica_pool = Pool(settings.DATABASE_POOL_MIN_SIZE, settings.DATABASE_POOL_MAX_SIZE,
+                                     settings.DATABASE_POOL_TIMEOUT, connection_factory=PreparingConnection,
+                                     **replica_connection_kwargs())
+    return _replica_pool
+
+
+class ReplicaHealth:
+    """Whether read-only transactions may use the replica, with routing counters.
+
+    A connection failure takes the replica out for DATABASE_REPLICA_RETRY_AFTER
+    seconds; the failed transaction and the ones after it run on the primary.
+    """
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        self.down_until = 0.0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def usable(self) -> bool:
+        return settings.DATABASE_REPLICA_HOST is not None and time.monotonic() >= self.down_until
+
+    def count(self, replica: bool):
+        with self._lock:
+            if replica:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+
+    def failed(self, error, mark_down: bool):
+        with self._lock:
+            self.fallbacks += 1
+            if mark_down:
+                self.failures += 1
+                self.down_until = time.monotonic() + self.retry_after
+        if mark_down:
+            logger.warning("Replica failed, reading from the primary for %.0f s: %s",
+                           self.retry_after, str(error).strip())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'configured': settings.DATABASE_REPLICA_HOST is not None,
+                'healthy': time.monotonic() >= self.down_until,
+                'replica_reads': self.replica_reads,
+                'primary_reads': self.primary_reads,
+                'fallbacks': self.fallbacks,
+                'failures': self.failures,
+            }
+
+
+replica_health = ReplicaHealth(settings.DATABASE_REPLICA_RETRY_AFTER)
+
+
+class Admission:
+    """Bounds the calls handed to the database thread pool.
+
+    The executor has one worker per pooled connection, so a worker never waits in
+    Pool.getconn; calls beyond that wait here, on the event loop, for at most
+    DATABASE_POOL_TIMEOUT seconds and then fail with 503 like a pool timeout.
+    """
+
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        self.timeouts = 0
+        # asyncio primitives belong to one event loop; tests and benchmarks run several.
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.size)
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = self._semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(status_code=503, detail="Database Unavailable")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+admission = Admission(settings.DATABASE_POOL_MAX_SIZE, settings.DATABASE_POOL_TIMEOUT)
+
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                # One worker per pooled connection (see Admission).
+                _executor = ThreadPoolExecutor(max_workers=settings.DATABASE_POOL_MAX_SIZE,
+                                               thread_name_prefix="db")
+    return _executor
+
+
+def close_pool():
+    global _pool, _replica_pool, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    with _replica_pool_lock:
+        if _replica_pool is not None:
+            _replica_pool.close()
+            _replica_pool = None
+
+
+@contextmanager
+def get_connection(replica: bool = False):
+    pool = get_replica_pool() if replica else get_pool()
+    connection = pool.getconn()
+    try:
+        yield connection
+    finally:
+        if not connection.closed:
+            connection.rollback()
+        pool.putconn(connection)
+
+
+@contextmanager
+def get_cursor(replica: bool = False):
+    """Yield a RealDictCursor (timed for /metrics) on a pooled connection.
+
+    The transaction is committed when the block exits normally and rolled back
+    when it raises (HTTPException included); either way the connection goes
+    back to the pool.
+    """
+    with get_connection(replica) as connection:
+        cur = connection.cursor(cursor_factory=TimedCursor)
+        try:
+            yield cur
+            connection.commit()
+        finally:
+            cur.close()
+
+
+def _transaction(func, args, replica: bool = False):
+    try:
+        with get_cursor(replica) as cur:
+            return func(cur, *args)
+    except StalePreparedStatement:
+        # Rolled back; the second attempt prepares its statements again.
+        with get_cursor(replica) as cur:
+            return func(cur, *args)
+
+
+def _call_in_transaction(func, *args, read_only: bool = False, primary: bool = False):
+    routing = current_routing.get()
+    if read_only and not primary:
+        pinned = routing is not None and routing.pinned
+        if not pinned and replica_health.usable():
+            try:
+                result = _transaction(func, args, replica=True)
+                replica_health.count(replica=True)
+                return result
+            except psycopg2.OperationalError as error:
+                # Recovery conflicts and statement timeouts say nothing about the
+                # replica's health; anything else (refused, reset, shut down) does.
+                replica_health.failed(error, mark_down=not isinstance(
+                    error, (psycopg2.extensions.TransactionRollbackError, psycopg2.extensions.QueryCanceledError)))
+    if read_only:
+        replica_health.count(replica=False)
+
+    result = _transaction(func, args)
+    if not read_only and routing is not None:
+        routing.wrote = True
+    return result
+
+
+async def run_in_transaction(func, *args, read_only: bool = False, primary: bool = False):
+    """Run ``func(cur, *args)`` in one transaction on the database thread pool.
+
+    ``read_only`` transactions go to the replica when one is configured and healthy
+    and the client is not pinned to the primary by a recent write; if the replica
+    fails they are retried on the primary. ``read_only`` with ``primary`` reads from
+    the primary without pinning the client to it (for reads that fill the cache).
+    Any other transaction is a write and pins the client.
+    """
+    loop = asyncio.get_running_loop()
+    # The request's context (and with it the metrics sample) follows the call into the thread.
+    context = contextvars.copy_context()
+    async with admission.slot():
+        return await loop.run_in_executor(get_executor(),
+                                          functools.partial(context.run, _call_in_transaction, func, *args,
+                                                            read_only=read_only, primary=primary))
+
+
+def _fetch_one(cur, query, params):
+    execute(cur, query, params)
+    return cur.fetchone()
+
+
+def _fetch_all(cur, query, params):
+    execute(cur, query, params)
+    return cur.fetchall()
+
+
+async def fetch_one(query, params=None, read_only: bool = False, primary: bool = False):
+    return await run_in_transaction(_fetch_one, query, params, read_only=read_only, primary=primary)
+
+
+async def fetch_all(query, params=None, read_only: bool = False, primary: bool = False):
+    return await run_in_transaction(_fetch_all, query, params, read_only=read_only, primary=primary)
@@ -0,0 +1,156 @@
+import asyncio
+import csv
+import io
+import json
+import threading
+import weakref
+from datetime import date, datetime
+from typing import Optional
+from uuid import uuid4
+
+import psycopg2
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+from starlette.background import BackgroundTask
+
+from dbs_assignment.config import settings
+from dbs_assignment.database import connection_kwargs, replica_connection_kwargs, replica_health
+
+router = APIRouter()
+
+# An export holds its connection for the whole stream, so it never takes one from the
+# request pools; this caps how many such connections exist.
+_export_slots = threading.BoundedSemaphore(settings.EXPORT_MAX_CONCURRENT)
+
+EXPORT_TABLES = {
+    'users': 'users',
+    'rentals': 'publication_loans',
+    'publication_loans': 'publication_loans',
+}
+
+# Rows fetched from the server-side cursor per round trip; also the size of one response chunk.
+EXPORT_BATCH_SIZE = 2000
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def format_batch(rows, fmt: str, header):
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(row, default=json_default) + '\n' for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows([value.isoformat() if isinstance(value, (date, datetime)) else value
+                      for value in row.values()] for row in rows)
+    return buffer.getvalue()
+
+
+def open_export_connection():
+    """A read-only connection of its own for one export: the replica's when usable, else the primary's."""
+    if replica_health.usable():
+        try:
+            connection = psycopg2.connect(**replica_connection_kwargs())
+        except psycopg2.OperationalError as error:
+            replica_health.failed(error, mark_down=True)
+        else:
+            connection.set_session(readonly=True)
+            return connection
+
+    connection = psycopg2.connect(**connection_kwargs())
+    connection.set_session(readonly=True)
+    return connection
+
+
+class ExportLease:
+    """An export slot and its connection, released once however the response ends.
+
+    The stream's own finally covers the usual cases; the response's background task
+    and a finalizer on the generator cover a client gone before the first chunk, when
+    the generator never starts.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        try:
+            self.connection.close()
+        finally:
+            _export_slots.release()
+
+
+async def acquire_export() -> ExportLease:
+    if not _export_slots.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail="Too Many Exports")
+    try:
+        connection = await asyncio.to_thread(open_export_connection)
+    except psycopg2.OperationalError:
+        _export_slots.release()
+        raise HTTPException(status_code=503, detail="Database Unavailable")
+    except BaseException:
+        _export_slots.release()
+        raise
+    return ExportLease(connection)
+
+
+def export_rows(lease: ExportLease, table: str, fmt: str, updated_since: Optional[datetime]):
+    """Stream a table through a named (server-side) cursor, one batch at a time.
+
+    Rows come out in (updated_at, id) order, so the last updated_at of one export is
+    a valid updated_since for the next incremental one.
+    """
+    params = {}
+    where = sql.SQL("")
+    if updated_since is not None:
+        where = sql.SQL("WHERE updated_at >= %(updated_since)s")
+        params['updated_since'] = updated_since
+
+    try:
+        cur = lease.connection.cursor(name='export_{}'.format(uuid4().hex), cursor_factory=RealDictCursor)
+        cur.execute(sql.SQL("""
+            SELECT * FROM {} {}
+            ORDER BY updated_at, id
+            """).format(sql.Identifier(table), where), params)
+
+        header = True
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield format_batch(rows, fmt, list(rows[0].keys()) if header else None)
+            header = False
+    finally:
+        lease.release()
+
+
+@router.get("/export/{table}", status_code=200)
+async def export_get(table: str, format: str = 'ndjson', updated_since: Optional[datetime] = None):
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Bad Request")
+
+    lease = await acquire_export()
+    # A sync generator is iterated on Starlette's thread pool, so the fetches do not block the loop.
+    rows = export_rows(lease, EXPORT_TABLES[table], format, updated_since)
+    weakref.finalize(rows, lease.release)
+    return StreamingResponse(rows, media_type=MEDIA_TYPES[format], background=BackgroundTask(lease.release))
@@ -2,16 +2,25 @@ from uuid import UUID, uuid4
 from datetime import date, datetime
 import psycopg2
 import re
-from fastapi import HTTPException
-from psycopg2.extras import RealDictCursor
+from fastapi import Header, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, UUID4
 
-from dbs_assignment.config import settings
-
-from fastapi import FastAPI, APIRouter
-from typing import Dict, Any, Optional
-
-app = FastAPI()
+from dbs_assignment import queries
+from dbs_assignment.availability import attach_availability
+from dbs_assignment.batch import batch_body, batch_ids, batch_response, fetch_batch
+from dbs_assignment.bulk import body_format, copy_rows, read_records, spool_body
+from dbs_assignment.cache import publication_cache
+from dbs_assignment.database import fetch_one, run_in_transaction
+from dbs_assignment.etags import etag_matches, not_modified, row_etag, strong_etag
+from dbs_assignment.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, list_page
+from dbs_assignment.patch import patch_row
+from dbs_assignment.queries import execute
+from dbs_assignment.reservations import fulfil_reservations
+from dbs_assignment.search import search_publications
+
+from fastapi import APIRouter
+from typing import Dict, Any, List, Optional
 
 router = APIRouter()
 
@@ -26,42 +35,6 @@ def check(email):
         return False
 
 
-def table_exists(table_name: str, cur):
-    cur.execute("""
-        SELECT EXISTS (
-            SELECT 1
-            FROM information_schema.tables
-            WHERE table_name = %s
-        )
-    """, (table_name,))
-    return cur.fetchone()
-
-
-def create_database():
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    check = table_exists('users', cur)['exists']
-    if check:
-        cur.close()
-        connection.close()
-        return
-
-    fd = open('create_db.sql', 'r')
-    sql_file = fd.read()
-    fd.close()
-    cur.execute(sql_file)
-    connection.commit()
-
-    cur.close()
-    connection.close()
-
-
-create_database()
-
-
 # region Classes
 
 
@@ -120,86 +93,65 @@ class Rental(BaseModel):
     duration: Optional[int] = None
 
 
+class Returns(BaseModel):
+    loan_ids: List[UUID] = []
+    instance_ids: List[UUID] = []
+
+
 class Reservation(BaseModel):
     id: UUID | None = uuid4()
     user_id: Optional[UUID] = None
     publication_id: Optional[UUID] = None
 
 
+class BatchGet(BaseModel):
+    ids: List[UUID]
+
+
 # endregion
 
 # region user
 
+@router.get("/users", status_code=200)
+async def users_list(cursor: Optional[str] = None,
+                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    page = await run_in_transaction(list_page, 'users', 'created_at', {}, cursor, limit, read_only=True)
+    return ORJSONResponse(page)
+
+
 @router.get("/users/{userID}", status_code=200)
-async def users_get(userID: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
+async def users_get(userID: UUID, if_none_match: Optional[str] = Header(None)):
+    # A client revalidating its copy only costs the validator query.
+    if if_none_match is not None:
+        validator = await fetch_one(queries.USER_ETAG,
+                                    {'userID': str(userID)}, read_only=True)
+        if validator is not None and etag_matches(if_none_match, strong_etag(validator['etag'])):
+            return not_modified(strong_etag(validator['etag']))
 
-    cur.execute("""
-                WITH sel_user AS (SELECT * FROM users WHERE id=(%(userID)s)),
-                reservations AS (SELECT JSON_AGG(JSON_BUILD_OBJECT('id', reservations.id, 'user_id', reservations.user_id, 'publication_id',
-                                           reservations.publication_id)) AS reservations
-                FROM reservations WHERE reservations.user_id = (%(userID)s)),
-                rentals AS (SELECT JSON_AGG(JSON_BUILD_OBJECT('id', publication_loans.id, 'user_id', publication_loans.user_id,
-                          'publication_instance_id', publication_loans.publication_instance_id,
-                          'duration', publication_loans.duration,
-                        'status', publication_loans.status)) AS rentals
-                FROM publication_loans WHERE publication_loans.user_id = (%(userID)s))
-                SELECT * FROM sel_user, reservations, rentals
-                """,
-                {'userID': str(userID)})
-
-    result = cur.fetchone()
+    result = await fetch_one(queries.USER_GET,
+                             {'userID': str(userID)}, read_only=True)
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
-    cur.close()
-    connection.close()
+    return Response(content=result['body'], media_type="application/json",
+                    headers={'ETag': strong_etag(result['etag'])})
 
-    if result['rentals'] is None:
-        del result['rentals']
-    if result['reservations'] is None:
-        del result['reservations']
 
-    return result
+@router.post("/users:batchGet", status_code=200)
+async def users_batch_get(batch: BatchGet):
+    ids = batch_ids(batch.ids)
+    rows = await run_in_transaction(fetch_batch, queries.USERS_BATCH_GET, ids, read_only=True)
+    bodies = {row_id: row['body'].encode() for row_id, row in rows.items()}
+    return Response(content=batch_body(bodies, ids), media_type="application/json")
 
 
 @router.patch("/users/{userID}", status_code=200)
 async def users_patch(userID: UUID, update_values: Dict[str, Any]):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    if isinstance(update_values, dict):
-        try:
-            for val in update_values:
-                cur.execute("""
-                            UPDATE users
-                            SET {} = (%(arg)s)
-                            WHERE id = (%(userID)s)
-                            """.format(val), {'arg': update_values[val], 'userID': str(userID)})
-        except psycopg2.errors.UniqueViolation:
-            raise HTTPException(status_code=409, detail="Email Already Taken")
-
-        cur.execute("""
-        UPDATE users
-        set updated_at=now()
-        WHERE id=(%(userID)s)
-        RETURNING *
-        """, {"userID": str(userID)})
-
-    else:
-        raise HTTPException(status_code=400, detail="Bad Request")
-
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
+    try:
+        result = await run_in_transaction(patch_row, 'users', userID, update_values)
+    except psycopg2.errors.UniqueViolation:
+        raise HTTPException(status_code=409, detail="Email Already Taken")
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
@@ -208,11 +160,6 @@ async def users_patch(userID: UUID, update_values: Dict[str, Any]):
 
 @router.post("/users", status_code=201)
 async def users_post(user: User):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
     if not check(user.email):
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
@@ -222,94 +169,162 @@ async def users_post(user: User):
         raise HTTPException(status_code=400, detail="Invalid date format for birth_date field")
 
     try:
-        cur.execute("""
-                    INSERT INTO users
-                    VALUES((%(id)s), (%(personal_identificator)s), (%(name)s), (%(surname)s),
-                    (%(email)s), (%(birth_date)s), now(), now())
-                    RETURNING *
-                    """,
-                    {'id': str(user.id),
-                     'personal_identificator': user.personal_identificator,
-                     'name': user.name,
-                     'surname': user.surname,
-                     'email': user.email,
-                     'birth_date': user.birth_date})
+        result = await fetch_one(queries.USER_INSERT,
+                                 {'id': str(user.id),
+                                  'personal_identificator': user.personal_identificator,
+                                  'name': user.name,
+                                  'surname': user.surname,
+                                  'email': user.email,
+                                  'birth_date': user.birth_date})
     except psycopg2.errors.UniqueViolation:
         raise HTTPException(status_code=409, detail="Email Already Taken")
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
-    result = cur.fetchone()
+    return result
 
-    cur.close()
-    connection.close()
 
-    return result
+def validate_bulk_user(record):
+    if record is None:
+        return None, "Malformed Row"
 
+    values = {key: str(record[key]).strip() if record.get(key) not in (None, '') else None
+              for key in ('id', 'personal_identificator', 'name', 'surname', 'email', 'birth_date')}
+    if None in (values['personal_identificator'], values['name'], values['surname'], values['birth_date']):
+        return None, "Missing Required Information"
+    if not check(values['email']):
+        return None, "Invalid Email"
 
-# endregion
+    try:
+        birth_date = datetime.strptime(values['birth_date'], '%Y-%m-%d').date()
+    except ValueError:
+        return None, "Invalid date format for birth_date field"
 
-# region cards
+    try:
+        user_id = UUID(values['id']) if values['id'] else uuid4()
+    except ValueError:
+        return None, "Invalid id"
 
+    return (user_id, values['personal_identificator'], values['name'], values['surname'],
+            values['email'], birth_date), None
 
-@router.get("/cards/{cardID}", status_code=200)
-async def cards_get(cardID: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
 
+def bulk_insert_users(cur, spool, fmt):
+    errors = []
+
+    def valid_rows():
+        for line, record in read_records(spool, fmt):
+            row, error = validate_bulk_user(record)
+            if error is None:
+                yield (line, *row)
+            else:
+                errors.append({'row': line, 'error': error})
+
+    cur.execute("""
+                CREATE TEMP TABLE users_staging (
+                  line integer, id uuid, personal_identificator text, name text,
+                  surname text, email text, birth_date date
+                ) ON COMMIT DROP
+                """)
+    copy_rows(cur, 'users_staging',
+              ('line', 'id', 'personal_identificator', 'name', 'surname', 'email', 'birth_date'),
+              valid_rows())
+
+    # Rows that collide with existing users or with an earlier row of the same batch
+    # are reported under the name of the constraint they would violate.
     cur.execute("""
-            SELECT *
-            FROM cards
-            WHERE cards.id=(%(cardID)s)
-            """,
-                {'cardID': str(cardID)})
+                WITH ranked AS (
+                  SELECT users_staging.*,
+                  row_number() OVER (PARTITION BY id ORDER BY line) AS id_rank,
+                  row_number() OVER (PARTITION BY email ORDER BY line) AS email_rank,
+                  row_number() OVER (PARTITION BY personal_identificator ORDER BY line) AS pi_rank
+                  FROM users_staging),
+                conflicts AS (
+                  SELECT line,
+                  CASE
+                    WHEN id_rank > 1 OR EXISTS (SELECT 1 FROM users WHERE users.id = ranked.id)
+                      THEN 'users_pkey'
+                    WHEN email_rank > 1 OR EXISTS (SELECT 1 FROM users WHERE users.email = ranked.email)
+                      THEN 'email_unq'
+                    WHEN pi_rank > 1 OR EXISTS (SELECT 1 FROM users
+                                                WHERE users.personal_identificator = ranked.personal_identificator)
+                      THEN 'personal_identificator_unq'
+                  END AS error
+                  FROM ranked)
+                DELETE FROM users_staging
+                USING conflicts
+                WHERE users_staging.line = conflicts.line
+                AND conflicts.error IS NOT NULL
+                RETURNING users_staging.line, conflicts.error
+                """)
+    errors.extend({'row': row['line'], 'error': row['error']} for row in cur.fetchall())
+
+    # ON CONFLICT only catches rows inserted concurrently since the check above.
+    cur.execute("""
+                WITH inserted AS (
+                  INSERT INTO users
+                  SELECT id, personal_identificator, name, surname, email, birth_date, now(), now()
+                  FROM users_staging
+                  ON CONFLICT DO NOTHING
+                  RETURNING id)
+                SELECT line FROM users_staging
+                WHERE NOT EXISTS (SELECT 1 FROM inserted WHERE inserted.id = users_staging.id)
+                """)
+    errors.extend({'row': row['line'], 'error': "Conflict"} for row in cur.fetchall())
+
+    cur.execute("SELECT count(*) AS staged FROM users_staging")
+    inserted = cur.fetchone()['staged'] - sum(1 for error in errors if error['error'] == "Conflict")
+
+    errors.sort(key=lambda error: error['row'])
+    return {'inserted': inserted, 'rejected': len(errors), 'errors': errors}
+
+
+@router.post("/users/bulk", status_code=200)
+async def users_bulk_post(request: Request):
+    fmt = body_format(request)
+    spool = await spool_body(request)
+    try:
+        return await run_in_transaction(bulk_insert_users, spool, fmt)
+    finally:
+        spool.close()
+
 
-    result = cur.fetchone()
+# endregion
+
+# region cards
 
-    cur.close()
-    connection.close()
+@router.get("/cards", status_code=200)
+async def cards_list(user_id: Optional[UUID] = None,
+                     status: Optional[str] = None,
+                     cursor: Optional[str] = None,
+                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    filters = {'user_id': user_id, 'status': status}
+    page = await run_in_transaction(list_page, 'cards', 'created_at', filters, cursor, limit, read_only=True)
+    return ORJSONResponse(page)
+
+
+@router.get("/cards/{cardID}", status_code=200)
+async def cards_get(cardID: UUID, if_none_match: Optional[str] = Header(None)):
+    result = await fetch_one(queries.CARD_GET,
+                             {'cardID': str(cardID)}, read_only=True)
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
-    return result
+    etag = row_etag(result)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    return ORJSONResponse(result, headers={'ETag': etag})
 
 
 @router.patch("/cards/{cardID}", status_code=200)
 async def cards_patch(cardID: UUID, update_values: Dict[str, Any]):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
     try:
-        if isinstance(update_values, dict):
-            for val in update_values:
-                cur.execute("""
-                            UPDATE cards
-                            SET {} = %(arg2)s
-                            WHERE cards.id = %(cardID)s
-                            """.format(val), {'arg2': update_values[val], 'cardID': str(cardID)})
-
-        cur.execute("""
-            UPDATE cards
-            set updated_at=now()
-            WHERE id=(%(cardID)s)
-            RETURNING *
-            """, {"cardID": str(cardID)})
-
+        result = await run_in_transaction(patch_row, 'cards', cardID, update_values)
     except psycopg2.errors.CheckViolation:
         raise HTTPException(status_code=400, detail="Bad Request")
 
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
-
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
@@ -318,402 +333,367 @@ async def cards_patch(cardID: UUID, update_values: Dict[str, Any]):
 
 @router.post("/cards", status_code=201)
 async def cards_post(card: Card):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
     try:
-        cur.execute("""
-                    INSERT INTO cards
-                    VALUES((%(id)s), (%(user_id)s), (%(magstripe)s), (%(status)s), now(), now())
-                    RETURNING *
-                    """,
-                    {'id': str(card.id),
-                     'user_id': str(card.user_id),
-                     'magstripe': card.magstripe,
-                     'status': card.status})
+        result = await fetch_one(queries.CARD_INSERT,
+                                 {'id': str(card.id),
+                                  'user_id': str(card.user_id),
+                                  'magstripe': card.magstripe,
+                                  'status': card.status})
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
-
     return result
 
 
 @router.delete("/cards/{cardID}", status_code=204)
 async def cards_delete(cardID: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-                DELETE FROM cards WHERE cards.id = (%(cardID)s)
-                RETURNING *
-                """,
-                {'cardID': str(cardID)})
+    result = await fetch_one(queries.CARD_DELETE,
+                             {'cardID': str(cardID)})
 
-    result = cur.fetchone()
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    connection.commit()
-
-    cur.close()
-    connection.close()
-
 
 # endregion
 
 # region publications
-@router.get("/publications/{publicationId}", status_code=200)
-async def publications_get(publicationId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute("""
-                WITH pub AS (SELECT * FROM publications WHERE publications.id = (%(publicationId)s)),
-                auth AS (SELECT JSON_AGG(JSON_BUILD_OBJECT('name', authors.name, 'surname', authors.surname)) AS authors
-                FROM authors
-                JOIN publication_authors ON publication_authors.author_id = authors.id
-                WHERE publication_authors.publication_id = (%(publicationId)s)),
-                cat AS (SELECT ARRAY_AGG(categories.name) AS categories
-                FROM categories
-                JOIN publication_categories ON publication_categories.category_id = categories.id
-                WHERE publication_categories.publication_id = (%(publicationId)s))
-                SELECT * FROM pub, auth, cat
-                """,
-                {'publicationId': str(publicationId)})
-
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
+@router.get("/publications", status_code=200)
+async def publications_list(cursor: Optional[str] = None,
+                            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    def select(cur):
+        page = list_page(cur, 'publications', 'created_at', {}, cursor, limit)
+        attach_availability(cur, page['items'])
+        return page
+
+    page = await run_in_transaction(select, read_only=True)
+    return ORJSONResponse(page)
+
+
+# Declared before /publications/{publicationId}, which would otherwise take "search" as an id.
+@router.get("/publications/search", status_code=200)
+async def publications_search(q: str = Query(..., min_length=1),
+                              cursor: Optional[str] = None,
+                              limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    def select(cur):
+        page = search_publications(cur, q, cursor, limit)
+        attach_availability(cur, page['items'])
+        return page
+
+    page = await run_in_transaction(select, read_only=True)
+    return ORJSONResponse(page)
+
+
+@router.get("/publications/{publicationId}", status_code=200)
+async def publications_get(publicationId: UUID, if_none_match: Optional[str] = Header(None)):
+    cached = publication_cache.get(str(publicationId))
+    if cached is not None:
+        etag, body = cached
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return Response(content=body, media_type="application/json", headers={'ETag': etag})
+
+    if if_none_match is not None:
+        validator = await fetch_one(queries.PUBLICATION_ETAG,
+                                    {'publicationId': str(publicationId)}, read_only=True)
+        if validator is not None and etag_matches(if_none_match, strong_etag(validator['etag'])):
+            return not_modified(strong_etag(validator['etag']))
+
+    # Read from the primary: a lagging replica could refill the cache with a body
+    # older than the invalidation that just evicted it.
+    version = publication_cache.version
+    result = await fetch_one(queries.PUBLICATION_GET,
+                             {'publicationId': str(publicationId)}, read_only=True, primary=True)
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
-    return result
+    etag, body = strong_etag(result['etag']), result['body'].encode()
+    publication_cache.set(str(publicationId), (etag, body), version)
+    return Response(content=body, media_type="application/json", headers={'ETag': etag})
+
+
+@router.post("/publications:batchGet", status_code=200)
+async def publications_batch_get(batch: BatchGet):
+    ids = batch_ids(batch.ids)
+    bodies = {}
+    for row_id in ids:
+        cached = publication_cache.get(row_id)
+        if cached is not None:
+            bodies[row_id] = cached[1]
+
+    # From the primary, like publications_get, because the rows go into the cache.
+    uncached = [row_id for row_id in ids if row_id not in bodies]
+    version = publication_cache.version
+    rows = await run_in_transaction(fetch_batch, queries.PUBLICATIONS_BATCH_GET, uncached,
+                                    read_only=True, primary=True) if uncached else {}
+    for row_id, row in rows.items():
+        bodies[row_id] = row['body'].encode()
+        publication_cache.set(row_id, (strong_etag(row['etag']), bodies[row_id]), version)
+
+    return Response(content=batch_body(bodies, ids), media_type="application/json")
+
+
+def link_publications(cur, publications):
+    """Link authors and categories (looked up by name) to publications, one INSERT per relation."""
+    author_links = [(str(publication.id), author.name, author.surname)
+                    for publication in publications
+                    if publication.authors and publication.authors[0].name is not None
+                    for author in publication.authors]
+    category_links = [(str(publication.id), category)
+                      for publication in publications
+                      if publication.categories is not None
+                      for category in publication.categories]
+
+    # An unknown name leaves author_id/category_id NULL, which the NOT NULL constraint rejects.
+    if author_links:
+        publication_ids, names, surnames = (list(column) for column in zip(*author_links))
+        execute(cur, queries.PUBLICATION_AUTHORS_LINK,
+                {'publication_ids': publication_ids,
+                 'names': names,
+                 'surnames': surnames})
+
+    if category_links:
+        publication_ids, names = (list(column) for column in zip(*category_links))
+        execute(cur, queries.PUBLICATION_CATEGORIES_LINK,
+                {'publication_ids': publication_ids,
+                 'names': names})
 
 
 @router.post("/publications", status_code=201)
 async def publications_post(publication: Publication):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    try:
-        cur.execute("""
-                    INSERT INTO publications
-                    VALUES((%(id)s), (%(title)s), now(), now())
-                    RETURNING *
-                    """,
-                    {'id': str(publication.id),
-                     'title': publication.title})
+    def insert(cur):
+        execute(cur, queries.PUBLICATION_INSERT,
+                {'id': str(publication.id),
+                 'title': publication.title})
 
         result = cur.fetchone()
         result['authors'] = publication.authors
         result['categories'] = publication.categories
 
-        if publication.authors is not None:
-            if publication.authors[0].name is not None:
-                for author in publication.authors:
-                    cur.execute("""
-                                INSERT INTO publication_authors
-                                VALUES((%(publication_id)s),
-                                (SELECT authors.id
-                                FROM authors
-                                WHERE authors.name=(%(author_name)s)
-                                AND authors.surname=(%(author_surname)s)))
-                                """,
-                                {'publication_id': str(publication.id),
-                                 'author_name': author.name,
-                                 'author_surname': author.surname})
-
-        if publication.categories is not None:
-            for category in publication.categories:
-                cur.execute("""
-                            INSERT INTO publication_categories
-                            VALUES(
-                            (SELECT categories.id
-                            FROM categories
-                            WHERE categories.name=(%(category_name)s)),
-                            (%(publication_id)s))
-                            """,
-                            {'publication_id': str(publication.id),
-                             'category_name': category})
+        link_publications(cur, [publication])
 
+        return result
+
+    try:
+        result = await run_in_transaction(insert)
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Something is wrong")
 
-    connection.commit()
+    publication_cache.invalidate(str(publication.id))
+    return result
+
+
+@router.post("/publications/bulk", status_code=201)
+async def publications_bulk_post(publications: list[Publication]):
+    for publication in publications:
+        # The model default id is evaluated once, so every record without an id would share it.
+        if 'id' not in publication.__fields_set__ or publication.id is None:
+            publication.id = uuid4()
+
+    def insert(cur):
+        execute(cur, queries.PUBLICATIONS_BULK_INSERT,
+                {'ids': [str(publication.id) for publication in publications],
+                 'titles': [publication.title for publication in publications]})
+
+        link_publications(cur, publications)
 
-    cur.close()
-    connection.close()
+        return {'inserted': len(publications), 'ids': [publication.id for publication in publications]}
+
+    try:
+        result = await run_in_transaction(insert)
+    except psycopg2.errors.UniqueViolation:
+        raise HTTPException(status_code=409, detail="Conflict")
+    except psycopg2.errors.NotNullViolation:
+        raise HTTPException(status_code=400, detail="Something is wrong")
 
+    publication_cache.invalidate(*(str(publication.id) for publication in publications))
     return result
 
 
 @router.delete("/publications/{publicationId}", status_code=204)
 async def publications_delete(publicationId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
+    result = await fetch_one(queries.PUBLICATION_DELETE,
+                             {'publicationId': str(publicationId)})
 
-    cur.execute("""
-                DELETE FROM publications WHERE publications.id = (%(publicationId)s)
-                RETURNING *
-                """,
-                {'publicationId': str(publicationId)})
+    publication_cache.invalidate(str(publicationId))
 
-    result = cur.fetchone()
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    connection.commit()
-
-    cur.close()
-    connection.close()
-
 
 # endregion
 
 # region instances
+
+@router.get("/instances", status_code=200)
+async def instances_list(publication_id: Optional[UUID] = None,
+                         status: Optional[str] = None,
+                         type: Optional[str] = None,
+                         cursor: Optional[str] = None,
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    filters = {'publication_id': publication_id, 'status': status, 'type': type}
+    page = await run_in_transaction(list_page, 'publication_instances', 'created_at', filters, cursor, limit,
+                                    read_only=True)
+    return ORJSONResponse(page)
+
+
+def select_instance(cur, instance_id):
+    execute(cur, queries.INSTANCE_GET,
+            {'instanceId': str(instance_id)})
+    return cur.fetchone()
+
+
 @router.post("/instances", status_code=201)
 async def instances_post(instance: Instance):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
+    def insert(cur):
+        execute(cur, queries.INSTANCE_INSERT,
+                {'id': str(instance.id),
+                 'publication_id': str(instance.publication_id),
+                 'publisher': instance.publisher,
+                 'type': instance.type,
+                 'status': instance.status,
+                 'year': instance.year})
+        result = cur.fetchone()
 
-    try:
-        cur.execute("""
-                    INSERT INTO publication_instances
-                    VALUES((%(id)s), (%(publication_id)s), (%(publisher)s), (%(type)s), (%(status)s),
-                    (%(year)s), now(), now())
-                    RETURNING *
-                    """,
-                    {'id': str(instance.id),
-                     'publication_id': str(instance.publication_id),
-                     'publisher': instance.publisher,
-                     'type': instance.type,
-                     'status': instance.status,
-                     'year': instance.year})
+        if fulfil_reservations(cur, [instance.id]):
+            result = select_instance(cur, instance.id)
+        return result
 
+    try:
+        result = await run_in_transaction(insert)
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
-
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
+    publication_cache.invalidate(str(result['publication_id']))
     return result
 
 
 @router.get("/instances/{instanceId}", status_code=200)
-async def instances_get(instanceId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
+async def instances_get(instanceId: UUID, if_none_match: Optional[str] = Header(None)):
+    result = await fetch_one(queries.INSTANCE_GET,
+                             {'instanceId': str(instanceId)}, read_only=True)
 
-    cur.execute("""
-            SELECT *
-            FROM publication_instances
-            WHERE publication_instances.id=(%(instanceId)s)
-            """,
-                {'instanceId': str(instanceId)})
+    if result is None:
+        raise HTTPException(status_code=404, detail="User Not Found")
 
-    result = cur.fetchone()
+    etag = row_etag(result)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
-    cur.close()
-    connection.close()
+    return ORJSONResponse(result, headers={'ETag': etag})
 
-    if result is None:
-        raise HTTPException(status_code=404, detail="User Not Found")
 
-    return result
+@router.post("/instances:batchGet", status_code=200)
+async def instances_batch_get(batch: BatchGet):
+    ids = batch_ids(batch.ids)
+    rows = await run_in_transaction(fetch_batch, queries.INSTANCES_BATCH_GET, ids, read_only=True)
+    return ORJSONResponse(batch_response(rows, ids))
 
 
 @router.delete("/instances/{instanceId}", status_code=204)
 async def instances_delete(instanceId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
+    result = await fetch_one(queries.INSTANCE_DELETE,
+                             {'instanceId': str(instanceId)})
 
-    cur.execute("""
-                DELETE FROM publication_instances WHERE publication_instances.id = (%(instanceId)s)
-                RETURNING *
-                """,
-                {'instanceId': str(instanceId)})
-
-    result = cur.fetchone()
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    connection.commit()
-
-    cur.close()
-    connection.close()
+    publication_cache.invalidate(str(result['publication_id']))
 
 
 @router.patch("/instances/{instanceId}", status_code=200)
 async def instances_patch(instanceId: UUID, update_values: Dict[str, Any]):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    if type(update_values) == 'dict':
-        for val in update_values:
-            cur.execute("""
-                        UPDATE publication_instances
-                        SET {} = (%(arg)s)
-                        WHERE id = (%(instanceId)s)
-                        """.format(val), {'arg': update_values[val], 'instanceId': str(instanceId)})
-
-    cur.execute("""
-    UPDATE publication_instances
-    set updated_at=now()
-    WHERE id=(%(instanceId)s)
-    RETURNING *
-    """, {"instanceId": str(instanceId)})
-
-    connection.commit()
-    result = cur.fetchone()
+    def update(cur):
+        result = patch_row(cur, 'publication_instances', instanceId, update_values)
+        if result is not None and result['status'] == 'available' and fulfil_reservations(cur, [instanceId]):
+            result = select_instance(cur, instanceId)
+        return result
 
-    cur.close()
-    connection.close()
+    try:
+        result = await run_in_transaction(update)
+    except psycopg2.errors.CheckViolation:
+        raise HTTPException(status_code=400, detail="Bad Request")
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
+    publication_cache.invalidate(str(result['publication_id']))
     return result
 
 
 # endregion
 
 # region authors
+
+@router.get("/authors", status_code=200)
+async def authors_list(cursor: Optional[str] = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    page = await run_in_transaction(list_page, 'authors', 'created_at', {}, cursor, limit, read_only=True)
+    return ORJSONResponse(page)
+
+
 @router.post("/authors", status_code=201)
 async def authors_post(author: Author):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
     try:
-        cur.execute("""
-                    INSERT INTO authors
-                    VALUES((%(id)s), (%(name)s), (%(surname)s), now(), now())
-                    RETURNING *
-                    """,
-                    {'id': str(author.id),
-                     'name': author.name,
-                     'surname': author.surname})
+        result = await fetch_one(queries.AUTHOR_INSERT,
+                                 {'id': str(author.id),
+                                  'name': author.name,
+                                  'surname': author.surname})
     except psycopg2.errors.UniqueViolation:
         raise HTTPException(status_code=409, detail="Conflict")
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
-
     return result
 
 
 @router.get("/authors/{authorId}", status_code=200)
-async def authors_get(authorId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
+async def authors_get(authorId: UUID, if_none_match: Optional[str] = Header(None)):
+    result = await fetch_one(queries.AUTHOR_GET,
+                             {'authorId': str(authorId)}, read_only=True)
 
-    cur.execute("""
-            SELECT *
-            FROM authors
-            WHERE authors.id=(%(authorId)s)
-            """,
-                {'authorId': str(authorId)})
+    if result is None:
+        raise HTTPException(status_code=404, detail="User Not Found")
 
-    result = cur.fetchone()
+    etag = row_etag(result)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
-    cur.close()
-    connection.close()
+    return ORJSONResponse(result, headers={'ETag': etag})
 
-    if result is None:
-        raise HTTPException(status_code=404, detail="User Not Found")
 
-    return result
+def linked_publications(cur, query, row_id):
+    execute(cur, query, {'row_id': str(row_id)})
+    return [str(row['publication_id']) for row in cur.fetchall()]
 
 
 @router.delete("/authors/{authorId}", status_code=204)
 async def authors_delete(authorId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-                DELETE FROM authors WHERE authors.id = (%(authorId)s)
-                RETURNING *
-                """,
+    def delete(cur):
+        publications = linked_publications(cur, queries.AUTHOR_PUBLICATIONS, authorId)
+        execute(cur, queries.AUTHOR_DELETE,
                 {'authorId': str(authorId)})
+        return cur.fetchone(), publications
+
+    result, publications = await run_in_transaction(delete)
+    publication_cache.invalidate(*publications)
 
-    result = cur.fetchone()
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    connection.commit()
-
-    cur.close()
-    connection.close()
-
 
 @router.patch("/authors/{authorId}", status_code=200)
 async def authors_patch(authorId: UUID, update_values: Dict[str, Any]):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    if isinstance(update_values, dict):
-        for val in update_values:
-            cur.execute("""
-                        UPDATE authors
-                        SET {} = (%(arg)s)
-                        WHERE id = (%(authorId)s)
-                        """.format(val), {'arg': update_values[val], 'authorId': str(authorId)})
+    def update(cur):
+        return (patch_row(cur, 'authors', authorId, update_values),
+                linked_publications(cur, queries.AUTHOR_PUBLICATIONS, authorId))
 
-    cur.execute("""
-    UPDATE authors
-    set updated_at=now()
-    WHERE id=(%(authorId)s)
-    RETURNING *
-    """, {"authorId": str(authorId)})
-
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
+    result, publications = await run_in_transaction(update)
+    publication_cache.invalidate(*publications)
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
@@ -724,30 +704,23 @@ async def authors_patch(authorId: UUID, update_values: Dict[str, Any]):
 # endregion
 
 # region categories
+
+@router.get("/categories", status_code=200)
+async def categories_list(cursor: Optional[str] = None,
+                          limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    page = await run_in_transaction(list_page, 'categories', 'created_at', {}, cursor, limit, read_only=True)
+    return ORJSONResponse(page)
+
+
 @router.post("/categories", status_code=201)
 async def categories_post(category: Category):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
     try:
-        cur.execute("""
-                    INSERT INTO categories
-                    VALUES((%(id)s), (%(name)s), now(), now())
-                    RETURNING *
-                    """,
-                    {'id': str(category.id),
-                     'name': category.name})
+        result = await fetch_one(queries.CATEGORY_INSERT,
+                                 {'id': str(category.id),
+                                  'name': category.name})
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
-
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
@@ -755,81 +728,46 @@ async def categories_post(category: Category):
 
 
 @router.get("/categories/{categoryId}", status_code=200)
-async def categories_get(categoryId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-            SELECT *
-            FROM categories
-            WHERE categories.id=(%(categoryId)s)
-            """,
-                {'categoryId': str(categoryId)})
-
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
+async def categories_get(categoryId: UUID, if_none_match: Optional[str] = Header(None)):
+    result = await fetch_one(queries.CATEGORY_GET,
+                             {'categoryId': str(categoryId)}, read_only=True)
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
-    return result
+    etag = row_etag(result)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    return ORJSONResponse(result, headers={'ETag': etag})
 
 
 @router.delete("/categories/{categoryId}", status_code=204)
 async def categories_delete(categoryId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-                DELETE FROM categories WHERE categories.id = (%(categoryId)s)
-                RETURNING *
-                """,
+    def delete(cur):
+        publications = linked_publications(cur, queries.CATEGORY_PUBLICATIONS, categoryId)
+        execute(cur, queries.CATEGORY_DELETE,
                 {'categoryId': str(categoryId)})
-    result = cur.fetchone()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not Found")
+        return cur.fetchone(), publications
 
-    connection.commit()
+    result, publications = await run_in_transaction(delete)
+    publication_cache.invalidate(*publications)
 
-    cur.close()
-    connection.close()
+    if result is None:
+        raise HTTPException(status_code=404, detail="Not Found")
 
 
 @router.patch("/categories/{categoryId}", status_code=200)
 async def categories_patch(categoryId: UUID, update_values: Dict[str, Any]):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    if isinstance(update_values, dict):
-        for val in update_values:
-            if not isinstance(val, str):
-                raise HTTPException(status_code=400, detail="Bad Request")
-            cur.execute("""
-                        UPDATE categories
-                        SET {} = (%(arg)s)
-                        WHERE id = (%(categoryId)s)
-                        """.format(val), {'arg': update_values[val], 'categoryId': str(categoryId)})
-
-    cur.execute("""
-    UPDATE categories
-    set updated_at=now()
-    WHERE id=(%(categoryId)s)
-    RETURNING *
-    """, {"categoryId": str(categoryId)})
-
-    connection.commit()
-    result = cur.fetchone()
+    def update(cur):
+        return (patch_row(cur, 'categories', categoryId, update_values),
+                linked_publications(cur, queries.CATEGORY_PUBLICATIONS, categoryId))
 
-    cur.close()
-    connection.close()
+    try:
+        result, publications = await run_in_transaction(update)
+    except psycopg2.errors.UniqueViolation:
+        raise HTTPException(status_code=409, detail="Conflict")
+    publication_cache.invalidate(*publications)
 
     if result is None:
         raise HTTPException(status_code=404, detail="Category Not Found")
@@ -840,162 +778,202 @@ async def categories_patch(categoryId: UUID, update_values: Dict[str, Any]):
 # endregion
 
 # region rentals
-@router.post("/rentals", status_code=201)
-async def rentals_post(rental: Rental):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
 
-    try:
-        cur.execute("""
-            select id from publication_instances
-            where publication_id=(%(publication_id)s)
-            and status='available'
-            limit 1
-            """, {'publication_id': str(rental.publication_id)})
+@router.get("/rentals", status_code=200)
+async def rentals_list(user_id: Optional[UUID] = None,
+                       publication_instance_id: Optional[UUID] = None,
+                       status: Optional[str] = None,
+                       cursor: Optional[str] = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    filters = {'user_id': user_id, 'publication_instance_id': publication_instance_id, 'status': status}
+    page = await run_in_transaction(list_page, 'publication_loans', 'start_date', filters, cursor, limit,
+                                    read_only=True)
+    return ORJSONResponse(page)
 
-        result = cur.fetchone()
-        if result:
-            publication_instance_id = result['id']  # Access the first element of the result tuple
-            print(publication_instance_id)
-        else:
-            raise HTTPException(status_code=400, detail="Bad request")
-
-        cur.execute("""
-                    INSERT INTO publication_loans
-                    VALUES((%(id)s), (%(user_id)s), (%(publication_id)s), now(),
-                    now() + INTERVAL '(%(duration)s) D', (%(duration)s))
-                    RETURNING *
-                    """,
-                    {'id': str(rental.id),
-                     'user_id': str(rental.user_id),
-                     'publication_id': str(publication_instance_id),
-                     'duration': rental.duration})
-
-        result = cur.fetchone()
-
-        cur.execute("""
-        UPDATE publication_instances
-        SET updated_at=now(),
-        status='reserved'
-        WHERE publication_instances.id=(%(publication_instance_id)s)
-        AND publication_instances.type='physical'
-        """, {'publication_instance_id': str(publication_instance_id)})
 
+@router.post("/rentals", status_code=201)
+async def rentals_post(rental: Rental):
+    # Allocation and loan insert are one statement. A copy held for the patron's own
+    # reservation is taken first (and the reservation consumed). Otherwise a physical
+    # copy is claimed with FOR UPDATE SKIP LOCKED, so parallel checkouts of the same
+    # title each get a different copy without queueing on each other's row locks.
+    # Digital copies are never exhausted and are only used when no physical copy is free.
+    try:
+        result = await fetch_one(queries.RENTAL_INSERT,
+                                 {'id': str(rental.id),
+                                  'user_id': str(rental.user_id),
+                                  'publication_id': str(rental.publication_id),
+                                  'duration': rental.duration})
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
+    if result is None:
+        raise HTTPException(status_code=400, detail="Bad request")
+
+    publication_cache.invalidate(str(rental.publication_id))
+    return result
 
-    cur.close()
-    connection.close()
 
+def return_loans(cur, loan_ids, instance_ids):
+    """Close every open loan named by loan id or by copy id, as one set-based update.
+
+    Only physical copies can be returned by copy id; an ebook or audiobook copy has
+    a loan per patron, so its id is reported as 'not_returned'. The freed physical
+    copies go back on the shelf and are handed to the reservation queue before the
+    transaction commits. Also returns the publications whose copies changed status.
+    """
+    execute(cur, queries.RENTALS_RETURN,
+            {'loan_ids': [str(loan_id) for loan_id in loan_ids],
+             'instance_ids': [str(instance_id) for instance_id in instance_ids]})
+    returned = cur.fetchall()
+
+    holds = fulfil_reservations(cur, [row['publication_instance_id'] for row in returned if row['freed']])
+    held_for = {hold['publication_instance_id']: hold['reservation_id'] for hold in holds}
+
+    by_loan = {str(row['loan_id']): row for row in returned}
+    by_instance = {str(row['publication_instance_id']): row for row in returned if row['freed']}
+
+    def outcome(row):
+        if row is None:
+            return {'status': 'not_returned'}
+        return {'status': 'returned',
+                'loan_id': row['loan_id'],
+                'publication_instance_id': row['publication_instance_id'],
+                'reservation_id': held_for.get(row['publication_instance_id'])}
+
+    result = {'loans': [{'id': loan_id, **outcome(by_loan.get(str(loan_id)))} for loan_id in loan_ids],
+              'instances': [{'id': instance_id, **outcome(by_instance.get(str(instance_id)))}
+                            for instance_id in instance_ids],
+              'returned': len(returned)}
+    return result, {str(row['publication_id']) for row in returned if row['freed']}
+
+
+@router.post("/rentals/returns", status_code=200)
+async def rentals_returns(returns: Returns):
+    # Drop-box processing: hundreds of scanned items are closed in one transaction.
+    # Items without an open loan are reported as 'not_returned' rather than failing
+    # the whole batch.
+    result, publications = await run_in_transaction(return_loans, returns.loan_ids, returns.instance_ids)
+    publication_cache.invalidate(*publications)
     return result
 
 
 @router.get("/rentals/{rentalId}", status_code=200)
 async def rentals_get(rentalId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-            SELECT duration, id, publication_instance_id, status, user_id
-            FROM publication_loans
-            WHERE publication_loans.id=(%(rentalId)s)
-            """,
-                {'rentalId': str(rentalId)})
-
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
+    result = await fetch_one(queries.RENTAL_GET,
+                             {'rentalId': str(rentalId)}, read_only=True)
 
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    return result
+    return ORJSONResponse(result)
+
+
+@router.post("/rentals:batchGet", status_code=200)
+async def rentals_batch_get(batch: BatchGet):
+    ids = batch_ids(batch.ids)
+    rows = await run_in_transaction(fetch_batch, queries.RENTALS_BATCH_GET, ids, read_only=True)
+    return ORJSONResponse(batch_response(rows, ids))
 
 
 # endregion
 
 # region reservations
+
+@router.get("/reservations", status_code=200)
+async def reservations_list(user_id: Optional[UUID] = None,
+                            publication_id: Optional[UUID] = None,
+                            cursor: Optional[str] = None,
+                            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    filters = {'user_id': user_id, 'publication_id': publication_id}
+    page = await run_in_transaction(list_page, 'reservations', 'created_at', filters, cursor, limit,
+                                    read_only=True)
+    return ORJSONResponse(page)
+
+
 @router.post("/reservations", status_code=201)
 async def reservations_post(reservation: Reservation):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-    try:
-        cur.execute("""
-                    INSERT INTO reservations
-                    VALUES((%(id)s), (%(publication_id)s), (%(user_id)s), now())
-                    RETURNING *
-                    """,
-                    {'id': str(reservation.id),
-                     'user_id': str(reservation.user_id),
-                     'publication_id': str(reservation.publication_id)})
+    def insert(cur):
+        execute(cur, queries.RESERVATION_INSERT,
+                {'id': str(reservation.id),
+                 'user_id': str(reservation.user_id),
+                 'publication_id': str(reservation.publication_id)})
+        result = cur.fetchone()
 
+        # A copy already on the shelf is held right away for the head of the queue.
+        execute(cur, queries.AVAILABLE_COPY_LOCK, {'publication_id': str(reservation.publication_id)})
+        available = cur.fetchone()
+        if available is not None:
+            for hold in fulfil_reservations(cur, [available['id']]):
+                if hold['reservation_id'] == result['id']:
+                    result['publication_instance_id'] = hold['publication_instance_id']
+        return result
+
+    try:
+        result = await run_in_transaction(insert)
     except psycopg2.errors.NotNullViolation:
         raise HTTPException(status_code=400, detail="Missing Required Information")
 
-    connection.commit()
-    result = cur.fetchone()
-    cur.close()
-    connection.close()
-
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
+    publication_cache.invalidate(str(result['publication_id']))
     return result
 
 
 @router.get("/reservations/{reservationId}", status_code=200)
 async def reservations_get(reservationId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-            SELECT *
-            FROM reservations
-            WHERE reservations.id=(%(reservationId)s)
-            """,
-                {'reservationId': str(reservationId)})
-
-    result = cur.fetchone()
-
-    cur.close()
-    connection.close()
+    result = await fetch_one(queries.RESERVATION_GET,
+                             {'reservationId': str(reservationId)}, read_only=True)
 
     if result is None:
         raise HTTPException(status_code=404, detail="User Not Found")
 
-    return result
+    return ORJSONResponse(result)
 
 
 @router.delete("/reservations/{reservationId}", status_code=204)
 async def reservations_delete(reservationId: UUID):
-    connection = psycopg2.connect(host=settings.DATABASE_HOST, dbname=settings.DATABASE_NAME,
-                                  user=settings.DATABASE_USER,
-                                  password=settings.DATABASE_PASSWORD, port=settings.DATABASE_PORT)
-    cur = connection.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-                DELETE FROM reservations WHERE reservations.id = (%(reservationId)s)
-                RETURNING *
-                """,
+    def delete(cur):
+        execute(cur, queries.RESERVATION_DELETE,
                 {'reservationId': str(reservationId)})
+        result = cur.fetchone()
+
+        # Cancelling a reservation that held a copy passes the copy to the next in line.
+        if result is not None and result['publication_instance_id'] is not None:
+            execute(cur, queries.INSTANCE_RELEASE, {'instanceId': str(result['publication_instance_id'])})
+            fulfil_reservations(cur, [result['publication_instance_id']])
+        return result
+
+    result = await run_in_transaction(delete)
 
-    result = cur.fetchone()
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    connection.commit()
-
-    cur.close()
-    connection.close()
+    if result['publication_instance_id'] is not None:
+        publication_cache.invalidate(str(result['publication_id']))
+
+
+@router.get("/publications/{publicationId}/queue", status_code=200)
+async def publications_queue_get(publicationId: UUID, user_id: Optional[UUID] = None):
+    def queue(cur):
+        # The length is one counter row; the position counts only the reservations
+        # ahead of the patron's, off the partial reservations_queue_idx.
+        execute(cur, queries.QUEUE_LENGTH, {'publicationId': str(publicationId)})
+        result = {'publication_id': publicationId, 'length': cur.fetchone()['length']}
+
+        if user_id is not None:
+            execute(cur, queries.QUEUE_POSITION, {'publicationId': str(publicationId), 'userId': str(user_id)})
+            mine = cur.fetchone()
+            if mine is None:
+                result['position'] = None
+            elif mine['publication_instance_id'] is not None:
+                result['position'] = 0
+                result['publication_instance_id'] = mine['publication_instance_id']
+            else:
+                result['position'] = mine['position']
+        return result
+
+    result = await run_in_transaction(queue, read_only=True)
+    return ORJSONResponse(result)
 # endregion
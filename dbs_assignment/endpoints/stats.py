@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Response
+
+from dbs_assignment.cache import publication_cache
+from dbs_assignment.database import pool_stats, replica_health
+from dbs_assignment.metrics import metrics
+from dbs_assignment.queries import registry
+from dbs_assignment.sweeper import overdue_sweeper
+
+router = APIRouter()
+
+
+@router.get("/stats/cache", status_code=200)
+async def cache_stats():
+    return {'publications': publication_cache.stats()}
+
+
+@router.get("/stats/sweeper", status_code=200)
+async def sweeper_stats():
+    return {'overdue': overdue_sweeper.stats()}
+
+
+@router.get("/stats/queries", status_code=200)
+async def query_stats():
+    return {'queries': registry.stats()}
+
+
+@router.get("/stats/replica", status_code=200)
+async def replica_stats():
+    return {'replica': replica_health.stats()}
+
+
+@router.get("/metrics", status_code=200)
+async def prometheus_metrics():
+    return Response(content=metrics.render(pool_stats()), media_type="text/plain; version=0.0.4")
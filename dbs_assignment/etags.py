@@ -0,0 +1,27 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+
+def strong_etag(validator: str) -> str:
+    return '"{}"'.format(validator)
+
+
+def row_etag(row) -> str:
+    """ETag of a single-row resource: every write to these tables sets updated_at = now()."""
+    return strong_etag(hashlib.md5('{}|{}'.format(row['id'], row['updated_at'].isoformat()).encode()).hexdigest())
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names etag (weak comparison, as RFC 9110 asks for GET)."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(','))
+    return etag in (candidate[2:] if candidate.startswith('W/') else candidate for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag})
@@ -0,0 +1,168 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from psycopg2.extras import RealDictCursor
+
+from dbs_assignment.slowlog import slow_query_log
+
+# Upper bounds (seconds) of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestSample:
+    """Database work done on behalf of one HTTP request."""
+
+    __slots__ = ('scope', 'queries', 'db_seconds', 'rows')
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+# The sample of the request being served. run_in_transaction copies the context
+# into the database thread, so TimedCursor adds to the same object.
+current_request: ContextVar = ContextVar('current_request', default=None)
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that charges execute() time and row counts to the current request.
+
+    Statements over the slow-query threshold are also handed to the slow-query log.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - started
+            sample = current_request.get()
+            if sample is not None:
+                sample.db_seconds += elapsed
+                sample.queries += 1
+                if self.rowcount > 0:
+                    sample.rows += self.rowcount
+            if slow_query_log.threshold and elapsed >= slow_query_log.threshold:
+                slow_query_log.record(self, query, vars, elapsed, route_of(sample))
+
+
+def route_of(sample) -> str:
+    if sample is None:
+        return 'background'
+    route = sample.scope.get('route')
+    return route.path if route is not None else 'unmatched'
+
+
+class RouteMetrics:
+    __slots__ = ('statuses', 'buckets', 'seconds', 'count', 'queries', 'db_seconds', 'rows')
+
+    def __init__(self):
+        self.statuses = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.seconds = 0.0
+        self.count = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+class Metrics:
+    """Per-route request counters and latency histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, sample: RequestSample):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            metrics.seconds += seconds
+            metrics.count += 1
+            metrics.queries += sample.queries
+            metrics.db_seconds += sample.db_seconds
+            metrics.rows += sample.rows
+
+    def render(self, pool_stats: dict) -> str:
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+
+            family('dbs_http_requests_total', 'counter', "HTTP requests by route and status code.")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append('dbs_http_requests_total{{method="{}",route="{}",status="{}"}} {}'
+                                 .format(method, route, status, count))
+
+            family('dbs_http_request_duration_seconds', 'histogram', "HTTP request latency by route.")
+            for (method, route), metrics in routes:
+                labels = 'method="{}",route="{}"'.format(method, route)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), metrics.buckets):
+                    cumulative += count
+                    lines.append('dbs_http_request_duration_seconds_bucket{{{},le="{}"}} {}'
+                                 .format(labels, bound, cumulative))
+                lines.append('dbs_http_request_duration_seconds_sum{{{}}} {}'.format(labels, metrics.seconds))
+                lines.append('dbs_http_request_duration_seconds_count{{{}}} {}'.format(labels, metrics.count))
+
+            for name, attribute, help_text in (
+                    ('dbs_db_queries_total', 'queries', "Statements executed while serving the route."),
+                    ('dbs_db_query_seconds_total', 'db_seconds', "Time spent in cursor.execute for the route."),
+                    ('dbs_db_rows_total', 'rows', "Rows returned or affected by the route's statements.")):
+                family(name, 'counter', help_text)
+                for (method, route), metrics in routes:
+                    lines.append('{}{{method="{}",route="{}"}} {}'
+                                 .format(name, method, route, getattr(metrics, attribute)))
+
+        family('dbs_db_pool_connections', 'gauge', "Pooled database connections by state.")
+        lines.append('dbs_db_pool_connections{{state="in_use"}} {}'.format(pool_stats['in_use']))
+        lines.append('dbs_db_pool_connections{{state="idle"}} {}'.format(pool_stats['idle']))
+        family('dbs_db_pool_max_connections', 'gauge', "Configured pool size.")
+        lines.append('dbs_db_pool_max_connections {}'.format(pool_stats['max_size']))
+        family('dbs_db_pool_timeouts_total', 'counter', "Requests that gave up waiting for a connection.")
+        lines.append('dbs_db_pool_timeouts_total {}'.format(pool_stats['timeouts']))
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request under its route template (e.g. /users/{userID})."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        sample = RequestSample(scope)
+        token = current_request.set(sample)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            metrics.observe(scope['method'], route_of(sample), status, time.perf_counter() - started, sample)
@@ -0,0 +1,105 @@
+import re
+from pathlib import Path
+
+from dbs_assignment.database import get_cursor
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+
+# Arbitrary key for pg_advisory_xact_lock so concurrently booting workers
+# apply migrations one at a time.
+MIGRATION_LOCK_ID = 7_301_001
+
+
+def table_exists(table_name: str, cur):
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1
+            FROM information_schema.tables
+            WHERE table_name = %s
+        )
+    """, (table_name,))
+    return cur.fetchone()
+
+
+def available_migrations():
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob('*.sql')):
+        match = re.fullmatch(r'(\d+)_(\w+)\.sql', path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return migrations
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cur.fetchall()}
+
+
+def latest_version():
+    return max((version for version, _, _ in available_migrations()), default=0)
+
+
+def current_version(cur):
+    """Return (number of applied migrations, highest applied version), or None without schema_migrations."""
+    if not table_exists('schema_migrations', cur)['exists']:
+        return None
+    cur.execute("SELECT count(*) AS applied, max(version) AS version FROM schema_migrations")
+    row = cur.fetchone()
+    return row['applied'], row['version']
+
+
+_up_to_date = False
+
+
+def ensure_schema():
+    """Apply missing migrations, skipping the migration lock when nothing is missing.
+
+    The outcome is cached for the process, so only the first call (the lifespan
+    startup) reads schema_migrations.
+    """
+    global _up_to_date
+    if _up_to_date:
+        return []
+
+    with get_cursor() as cur:
+        current = current_version(cur)
+    applied = [] if current == (len(available_migrations()), latest_version()) else migrate()
+    _up_to_date = True
+    return applied
+
+
+def migrate():
+    """Apply every migration in MIGRATIONS_DIR that is not yet recorded in schema_migrations.
+
+    Databases created by the old one-shot create_db.sql already have the tables of
+    0001 but no schema_migrations table; they are baselined at version 1.
+    """
+    applied = []
+    with get_cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+
+        if not table_exists('schema_migrations', cur)['exists']:
+            legacy_schema = table_exists('users', cur)['exists']
+            cur.execute("""
+                CREATE TABLE schema_migrations (
+                  "version" integer PRIMARY KEY,
+                  "name" text NOT NULL,
+                  "applied_at" timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+            if legacy_schema:
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (1, 'create_schema')")
+
+        done = applied_versions(cur)
+        for version, name, path in available_migrations():
+            if version in done:
+                continue
+            cur.execute(path.read_text())
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            applied.append(version)
+
+    return applied
+
+
+if __name__ == '__main__':
+    print("Applied migrations:", migrate() or "none")
@@ -0,0 +1,21 @@
+CREATE INDEX IF NOT EXISTS "cards_user_id_idx" ON "cards" ("user_id");
+
+CREATE INDEX IF NOT EXISTS "publication_instances_publication_id_idx" ON "publication_instances" ("publication_id");
+
+CREATE INDEX IF NOT EXISTS "publication_loans_user_id_idx" ON "publication_loans" ("user_id");
+
+CREATE INDEX IF NOT EXISTS "publication_loans_publication_instance_id_idx" ON "publication_loans" ("publication_instance_id");
+
+CREATE INDEX IF NOT EXISTS "reservations_user_id_idx" ON "reservations" ("user_id");
+
+CREATE INDEX IF NOT EXISTS "reservations_publication_id_idx" ON "reservations" ("publication_id");
+
+CREATE INDEX IF NOT EXISTS "publication_authors_publication_id_idx" ON "publication_authors" ("publication_id", "author_id");
+
+CREATE INDEX IF NOT EXISTS "publication_authors_author_id_idx" ON "publication_authors" ("author_id");
+
+CREATE INDEX IF NOT EXISTS "publication_categories_publication_id_idx" ON "publication_categories" ("publication_id", "category_id");
+
+CREATE INDEX IF NOT EXISTS "publication_categories_category_id_idx" ON "publication_categories" ("category_id");
+
+CREATE INDEX IF NOT EXISTS "authors_name_surname_idx" ON "authors" ("name", "surname");
@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS "publication_instances_available_idx"
+ON "publication_instances" ("publication_id")
+WHERE status='available';
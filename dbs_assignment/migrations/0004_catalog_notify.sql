@@ -0,0 +1,36 @@
+CREATE OR REPLACE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+DECLARE
+  changed record;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    changed := OLD;
+  ELSE
+    changed := NEW;
+  END IF;
+
+  IF TG_TABLE_NAME IN ('publication_authors', 'publication_categories') THEN
+    PERFORM pg_notify('catalog_changes',
+                      json_build_object('table', 'publications', 'id', changed.publication_id)::text);
+  ELSE
+    PERFORM pg_notify('catalog_changes',
+                      json_build_object('table', TG_TABLE_NAME, 'id', changed.id)::text);
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "publications_notify" AFTER INSERT OR UPDATE OR DELETE ON "publications"
+FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER "authors_notify" AFTER UPDATE OR DELETE ON "authors"
+FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER "categories_notify" AFTER UPDATE OR DELETE ON "categories"
+FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER "publication_authors_notify" AFTER INSERT OR UPDATE OR DELETE ON "publication_authors"
+FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER "publication_categories_notify" AFTER INSERT OR UPDATE OR DELETE ON "publication_categories"
+FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
@@ -0,0 +1,36 @@
+CREATE INDEX IF NOT EXISTS "users_created_at_id_idx" ON "users" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "cards_created_at_id_idx" ON "cards" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "publications_created_at_id_idx" ON "publications" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "authors_created_at_id_idx" ON "authors" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "categories_created_at_id_idx" ON "categories" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "publication_instances_created_at_id_idx" ON "publication_instances" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "publication_loans_start_date_id_idx" ON "publication_loans" ("start_date", "id");
+
+CREATE INDEX IF NOT EXISTS "reservations_created_at_id_idx" ON "reservations" ("created_at", "id");
+
+-- Filtered listings seek on (filter, key, id). These replace the single-column
+-- foreign-key indexes from 0002, which are prefixes of them.
+CREATE INDEX IF NOT EXISTS "cards_user_id_created_at_id_idx" ON "cards" ("user_id", "created_at", "id");
+DROP INDEX IF EXISTS "cards_user_id_idx";
+
+CREATE INDEX IF NOT EXISTS "publication_instances_publication_id_created_at_id_idx"
+ON "publication_instances" ("publication_id", "created_at", "id");
+DROP INDEX IF EXISTS "publication_instances_publication_id_idx";
+
+CREATE INDEX IF NOT EXISTS "publication_loans_user_id_start_date_id_idx"
+ON "publication_loans" ("user_id", "start_date", "id");
+DROP INDEX IF EXISTS "publication_loans_user_id_idx";
+
+CREATE INDEX IF NOT EXISTS "reservations_user_id_created_at_id_idx"
+ON "reservations" ("user_id", "created_at", "id");
+DROP INDEX IF EXISTS "reservations_user_id_idx";
+
+CREATE INDEX IF NOT EXISTS "reservations_publication_id_created_at_id_idx"
+ON "reservations" ("publication_id", "created_at", "id");
+DROP INDEX IF EXISTS "reservations_publication_id_idx";
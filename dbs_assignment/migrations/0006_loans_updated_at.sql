@@ -0,0 +1,5 @@
+ALTER TABLE "publication_loans" ADD COLUMN "updated_at" timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS "users_updated_at_id_idx" ON "users" ("updated_at", "id");
+
+CREATE INDEX IF NOT EXISTS "publication_loans_updated_at_id_idx" ON "publication_loans" ("updated_at", "id");
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS "publication_loans_status_end_date_idx" ON "publication_loans" ("status", "end_date");
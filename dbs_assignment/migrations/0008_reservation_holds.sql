@@ -0,0 +1,13 @@
+ALTER TABLE "reservations" ADD COLUMN "publication_instance_id" uuid;
+
+ALTER TABLE "reservations" ADD FOREIGN KEY ("publication_instance_id") REFERENCES "publication_instances" ("id") ON DELETE SET NULL;
+
+-- A copy can be held for at most one reservation.
+CREATE UNIQUE INDEX IF NOT EXISTS "reservations_publication_instance_id_idx"
+ON "reservations" ("publication_instance_id")
+WHERE publication_instance_id IS NOT NULL;
+
+-- The waiting queue of a publication, oldest first.
+CREATE INDEX IF NOT EXISTS "reservations_queue_idx"
+ON "reservations" ("publication_id", "created_at", "id")
+WHERE publication_instance_id IS NULL;
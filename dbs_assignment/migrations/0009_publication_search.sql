@@ -0,0 +1,114 @@
+-- Search document of every publication: its title (weight A), author names (B) and
+-- category names (C). `terms` is the same text lowercased, for trigram matching.
+CREATE TABLE IF NOT EXISTS "publication_search" (
+  "publication_id" uuid PRIMARY KEY REFERENCES "publications" ("id") ON DELETE CASCADE,
+  "document" tsvector NOT NULL,
+  "terms" text NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS "publication_search_document_idx"
+ON "publication_search" USING gin ("document");
+
+CREATE OR REPLACE FUNCTION refresh_publication_search(publication_ids uuid[]) RETURNS void AS $$
+  INSERT INTO publication_search (publication_id, document, terms)
+  SELECT publications.id,
+         setweight(to_tsvector('simple', publications.title), 'A')
+         || setweight(to_tsvector('simple', coalesce(authors.names, '')), 'B')
+         || setweight(to_tsvector('simple', coalesce(categories.names, '')), 'C'),
+         lower(concat_ws(' ', publications.title, authors.names, categories.names))
+  FROM publications
+  LEFT JOIN LATERAL (
+    SELECT string_agg(authors.name || ' ' || authors.surname, ' ') AS names
+    FROM publication_authors
+    JOIN authors ON authors.id = publication_authors.author_id
+    WHERE publication_authors.publication_id = publications.id) AS authors ON true
+  LEFT JOIN LATERAL (
+    SELECT string_agg(categories.name, ' ') AS names
+    FROM publication_categories
+    JOIN categories ON categories.id = publication_categories.category_id
+    WHERE publication_categories.publication_id = publications.id) AS categories ON true
+  WHERE publications.id = ANY(publication_ids)
+  ON CONFLICT (publication_id) DO UPDATE
+  SET document = EXCLUDED.document, terms = EXCLUDED.terms;
+$$ LANGUAGE sql;
+
+-- Statement-level triggers: a bulk insert refreshes all of its publications in one pass.
+CREATE OR REPLACE FUNCTION publication_search_changed() RETURNS trigger AS $$
+BEGIN
+  IF TG_TABLE_NAME = 'publications' AND TG_OP = 'INSERT' THEN
+    PERFORM refresh_publication_search(ARRAY(SELECT id FROM new_rows));
+  ELSIF TG_TABLE_NAME = 'publications' THEN
+    PERFORM refresh_publication_search(ARRAY(
+      SELECT new_rows.id FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+      WHERE new_rows.title IS DISTINCT FROM old_rows.title));
+  ELSIF TG_TABLE_NAME IN ('publication_authors', 'publication_categories') AND TG_OP = 'INSERT' THEN
+    PERFORM refresh_publication_search(ARRAY(SELECT DISTINCT publication_id FROM new_rows));
+  ELSIF TG_TABLE_NAME IN ('publication_authors', 'publication_categories') THEN
+    PERFORM refresh_publication_search(ARRAY(SELECT DISTINCT publication_id FROM old_rows));
+  ELSIF TG_TABLE_NAME = 'authors' THEN
+    PERFORM refresh_publication_search(ARRAY(
+      SELECT DISTINCT publication_authors.publication_id
+      FROM new_rows
+      JOIN old_rows ON old_rows.id = new_rows.id
+      JOIN publication_authors ON publication_authors.author_id = new_rows.id
+      WHERE (new_rows.name, new_rows.surname) IS DISTINCT FROM (old_rows.name, old_rows.surname)));
+  ELSE
+    PERFORM refresh_publication_search(ARRAY(
+      SELECT DISTINCT publication_categories.publication_id
+      FROM new_rows
+      JOIN old_rows ON old_rows.id = new_rows.id
+      JOIN publication_categories ON publication_categories.category_id = new_rows.id
+      WHERE new_rows.name IS DISTINCT FROM old_rows.name));
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "publications_search_insert" AFTER INSERT ON "publications"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "publications_search_update" AFTER UPDATE ON "publications"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "publication_authors_search_insert" AFTER INSERT ON "publication_authors"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "publication_authors_search_delete" AFTER DELETE ON "publication_authors"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "publication_categories_search_insert" AFTER INSERT ON "publication_categories"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "publication_categories_search_delete" AFTER DELETE ON "publication_categories"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "authors_search_update" AFTER UPDATE ON "authors"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+CREATE TRIGGER "categories_search_update" AFTER UPDATE ON "categories"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_search_changed();
+
+SELECT refresh_publication_search(ARRAY(SELECT id FROM publications));
+
+ANALYZE "publication_search";
+
+-- Typo-tolerant matching needs pg_trgm, which is not installed everywhere; without it
+-- the search endpoint only does full-text matching.
+DO $$
+BEGIN
+  CREATE EXTENSION IF NOT EXISTS pg_trgm;
+  CREATE INDEX IF NOT EXISTS "publication_search_terms_trgm_idx"
+  ON "publication_search" USING gin ("terms" gin_trgm_ops);
+EXCEPTION WHEN OTHERS THEN
+  RAISE NOTICE 'pg_trgm is not available, publication search will not match typos: %', SQLERRM;
+END
+$$;
@@ -0,0 +1,93 @@
+-- Copies of each publication by type and status, kept in step with publication_instances.
+CREATE TABLE IF NOT EXISTS "publication_availability" (
+  "publication_id" uuid NOT NULL REFERENCES "publications" ("id") ON DELETE CASCADE,
+  "type" text NOT NULL,
+  "available" integer NOT NULL DEFAULT 0,
+  "reserved" integer NOT NULL DEFAULT 0,
+  PRIMARY KEY ("publication_id", "type")
+);
+
+-- Adds a set of (publication_id, type, available, reserved) deltas to the counters.
+-- Rows are upserted in key order, so two transactions touching the same counters
+-- lock them in the same order and cannot deadlock each other.
+CREATE OR REPLACE FUNCTION add_publication_availability(changes publication_availability[]) RETURNS void AS $$
+  INSERT INTO publication_availability AS counts (publication_id, type, available, reserved)
+  SELECT delta.publication_id, delta.type, sum(delta.available), sum(delta.reserved)
+  FROM unnest(changes) AS delta
+  -- Copies deleted together with their publication have nothing left to count.
+  JOIN publications ON publications.id = delta.publication_id
+  GROUP BY delta.publication_id, delta.type
+  HAVING sum(delta.available) <> 0 OR sum(delta.reserved) <> 0
+  ORDER BY delta.publication_id, delta.type
+  ON CONFLICT (publication_id, type) DO UPDATE
+  SET available = counts.available + EXCLUDED.available,
+      reserved = counts.reserved + EXCLUDED.reserved;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION publication_instances_counted() RETURNS trigger AS $$
+DECLARE
+  changes publication_availability[] := '{}';
+BEGIN
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    changes := changes || ARRAY(
+      SELECT ROW(publication_id, type, (status = 'available')::int, (status = 'reserved')::int)::publication_availability
+      FROM new_rows);
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    changes := changes || ARRAY(
+      SELECT ROW(publication_id, type, -(status = 'available')::int, -(status = 'reserved')::int)::publication_availability
+      FROM old_rows);
+  END IF;
+
+  PERFORM add_publication_availability(changes);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "publication_instances_count_insert" AFTER INSERT ON "publication_instances"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_instances_counted();
+
+CREATE TRIGGER "publication_instances_count_update" AFTER UPDATE ON "publication_instances"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_instances_counted();
+
+CREATE TRIGGER "publication_instances_count_delete" AFTER DELETE ON "publication_instances"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publication_instances_counted();
+
+-- The triggers above hold a lock on publication_instances until this migration
+-- commits, so no copy changes between the recount and the first delta.
+INSERT INTO publication_availability (publication_id, type, available, reserved)
+SELECT publication_id, type, count(*) FILTER (WHERE status = 'available'), count(*) FILTER (WHERE status = 'reserved')
+FROM publication_instances
+GROUP BY publication_id, type
+ON CONFLICT (publication_id, type) DO UPDATE
+SET available = EXCLUDED.available, reserved = EXCLUDED.reserved;
+
+-- Cached publication bodies embed the counts, so a counter change evicts them like
+-- an author or category link change does.
+CREATE OR REPLACE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+DECLARE
+  changed record;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    changed := OLD;
+  ELSE
+    changed := NEW;
+  END IF;
+
+  IF TG_TABLE_NAME IN ('publication_authors', 'publication_categories', 'publication_availability') THEN
+    PERFORM pg_notify('catalog_changes',
+                      json_build_object('table', 'publications', 'id', changed.publication_id)::text);
+  ELSE
+    PERFORM pg_notify('catalog_changes',
+                      json_build_object('table', TG_TABLE_NAME, 'id', changed.id)::text);
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "publication_availability_notify" AFTER INSERT OR UPDATE ON "publication_availability"
+FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
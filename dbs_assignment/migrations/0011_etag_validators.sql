@@ -0,0 +1,27 @@
+-- ETag validators of the composite user and publication documents. They change
+-- whenever the GET body would (every write sets updated_at, child rows are counted)
+-- and cost a few index lookups instead of building the JSON.
+CREATE OR REPLACE FUNCTION user_etag(user_id uuid) RETURNS text AS $$
+  SELECT md5(concat_ws('|', users.id, users.updated_at,
+    (SELECT concat(count(*), ':', max(publication_loans.updated_at))
+     FROM publication_loans WHERE publication_loans.user_id = users.id),
+    (SELECT concat(count(*), ':', max(reservations.created_at))
+     FROM reservations WHERE reservations.user_id = users.id)))
+  FROM users WHERE users.id = user_etag.user_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION publication_etag(publication_id uuid) RETURNS text AS $$
+  SELECT md5(concat_ws('|', publications.id, publications.updated_at,
+    (SELECT concat(count(*), ':', max(authors.updated_at))
+     FROM authors
+     JOIN publication_authors ON publication_authors.author_id = authors.id
+     WHERE publication_authors.publication_id = publications.id),
+    (SELECT concat(count(*), ':', max(categories.updated_at))
+     FROM categories
+     JOIN publication_categories ON publication_categories.category_id = categories.id
+     WHERE publication_categories.publication_id = publications.id),
+    (SELECT string_agg(concat(type, ':', available, ':', reserved), ',' ORDER BY type)
+     FROM publication_availability
+     WHERE publication_availability.publication_id = publications.id)))
+  FROM publications WHERE publications.id = publication_etag.publication_id;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,61 @@
+-- Waiting (not yet held) reservations of each publication, kept in step with reservations.
+CREATE TABLE IF NOT EXISTS "publication_queue" (
+  "publication_id" uuid PRIMARY KEY REFERENCES "publications" ("id") ON DELETE CASCADE,
+  "waiting" integer NOT NULL DEFAULT 0
+);
+
+-- Adds a set of (publication_id, waiting) deltas to the counters, in key order like
+-- add_publication_availability.
+CREATE OR REPLACE FUNCTION add_publication_queue(changes publication_queue[]) RETURNS void AS $$
+  INSERT INTO publication_queue AS counts (publication_id, waiting)
+  SELECT delta.publication_id, sum(delta.waiting)
+  FROM unnest(changes) AS delta
+  -- Reservations deleted together with their publication have nothing left to count.
+  JOIN publications ON publications.id = delta.publication_id
+  GROUP BY delta.publication_id
+  HAVING sum(delta.waiting) <> 0
+  ORDER BY delta.publication_id
+  ON CONFLICT (publication_id) DO UPDATE
+  SET waiting = counts.waiting + EXCLUDED.waiting;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION reservations_counted() RETURNS trigger AS $$
+DECLARE
+  changes publication_queue[] := '{}';
+BEGIN
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    changes := changes || ARRAY(
+      SELECT ROW(publication_id, (publication_instance_id IS NULL)::int)::publication_queue
+      FROM new_rows);
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    changes := changes || ARRAY(
+      SELECT ROW(publication_id, -(publication_instance_id IS NULL)::int)::publication_queue
+      FROM old_rows);
+  END IF;
+
+  PERFORM add_publication_queue(changes);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "reservations_count_insert" AFTER INSERT ON "reservations"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION reservations_counted();
+
+CREATE TRIGGER "reservations_count_update" AFTER UPDATE ON "reservations"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION reservations_counted();
+
+CREATE TRIGGER "reservations_count_delete" AFTER DELETE ON "reservations"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION reservations_counted();
+
+-- As in 0010, the triggers' lock on reservations keeps the recount exact.
+INSERT INTO publication_queue (publication_id, waiting)
+SELECT publication_id, count(*)
+FROM reservations
+WHERE publication_instance_id IS NULL
+GROUP BY publication_id
+ON CONFLICT (publication_id) DO UPDATE
+SET waiting = EXCLUDED.waiting;
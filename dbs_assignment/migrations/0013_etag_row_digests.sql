@@ -0,0 +1,28 @@
+-- The 0011 validators compared child rows by count and newest timestamp, but
+-- updated_at is the transaction's start time, so two edits could leave both unchanged
+-- and a client would get a stale 304. These digest the text of every row the
+-- document is built from instead, in id order.
+CREATE OR REPLACE FUNCTION user_etag(user_id uuid) RETURNS text AS $$
+  SELECT md5(concat_ws('|', users::text,
+    (SELECT string_agg(publication_loans::text, ',' ORDER BY publication_loans.id)
+     FROM publication_loans WHERE publication_loans.user_id = users.id),
+    (SELECT string_agg(reservations::text, ',' ORDER BY reservations.id)
+     FROM reservations WHERE reservations.user_id = users.id)))
+  FROM users WHERE users.id = user_etag.user_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION publication_etag(publication_id uuid) RETURNS text AS $$
+  SELECT md5(concat_ws('|', publications::text,
+    (SELECT string_agg(authors::text, ',' ORDER BY authors.id)
+     FROM authors
+     JOIN publication_authors ON publication_authors.author_id = authors.id
+     WHERE publication_authors.publication_id = publications.id),
+    (SELECT string_agg(categories::text, ',' ORDER BY categories.id)
+     FROM categories
+     JOIN publication_categories ON publication_categories.category_id = categories.id
+     WHERE publication_categories.publication_id = publications.id),
+    (SELECT string_agg(publication_availability::text, ',' ORDER BY type)
+     FROM publication_availability
+     WHERE publication_availability.publication_id = publications.id)))
+  FROM publications WHERE publications.id = publication_etag.publication_id;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,96 @@
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from dbs_assignment.cache import publication_cache
+from dbs_assignment.database import connection_kwargs
+
+CHANNEL = 'catalog_changes'
+
+# Tables whose rows are linked to publications by <column> in <link table>.
+LINKED_TABLES = {
+    'authors': ('publication_authors', 'author_id'),
+    'categories': ('publication_categories', 'category_id'),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogListener:
+    """Background thread that LISTENs on CHANNEL and evicts the matching cache entries.
+
+    The notifications come from the triggers in migration 0004, so writes made by
+    any worker (or by hand in psql) reach every process's cache.
+    """
+
+    def __init__(self, poll_interval: float = 1.0, reconnect_delay: float = 1.0):
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='catalog-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                # Whatever went wrong, keep listening: a dead thread would silently
+                # stop invalidation until the process restarts.
+                logger.exception("Catalog listener failed, reconnecting")
+                self._stop.wait(self.reconnect_delay)
+
+    def _listen(self):
+        connection = psycopg2.connect(**connection_kwargs())
+        try:
+            connection.autocommit = True
+            cur = connection.cursor(cursor_factory=RealDictCursor)
+            cur.execute("LISTEN {}".format(CHANNEL))
+            # Anything written while we were not listening may be cached stale.
+            publication_cache.clear()
+
+            while not self._stop.is_set():
+                if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    payload = connection.notifies.pop(0).payload
+                    try:
+                        self.handle(cur, payload)
+                    except psycopg2.OperationalError:
+                        raise
+                    except Exception:
+                        # A payload we cannot act on (not JSON, no table or id, a bad id)
+                        # may still stand for a change, so drop everything to be safe.
+                        logger.exception("Bad catalog notification %r, clearing the cache", payload)
+                        publication_cache.clear()
+        finally:
+            connection.close()
+
+    def handle(self, cur, payload: str):
+        change = json.loads(payload)
+        if change['table'] == 'publications':
+            publication_cache.invalidate(change['id'])
+        elif change['table'] in LINKED_TABLES:
+            link_table, link_column = LINKED_TABLES[change['table']]
+            cur.execute("""
+                        SELECT publication_id FROM {} WHERE {} = %(row_id)s
+                        """.format(link_table, link_column), {'row_id': change['id']})
+            publication_cache.invalidate(*(str(row['publication_id']) for row in cur.fetchall()))
+
+
+catalog_listener = CatalogListener()
@@ -0,0 +1,76 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+from psycopg2 import sql
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(key, row_id) -> str:
+    if hasattr(key, 'isoformat'):
+        key = key.isoformat()
+    payload = json.dumps([key, str(row_id)]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def parse_timestamp(key) -> datetime:
+    if not isinstance(key, str):
+        raise TypeError("cursor key is not a timestamp")
+    return datetime.fromisoformat(key)
+
+
+def decode_cursor(cursor: str, parse_key=parse_timestamp):
+    """Split a cursor into (key, row id), answering 400 before any SQL runs if it is malformed.
+
+    parse_key turns the raw JSON key into the value the query compares with, raising
+    ValueError or TypeError when it cannot; the id must be a uuid string.
+    """
+    try:
+        key, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(row_id, str):
+            raise TypeError("cursor id is not a string")
+        return parse_key(key), str(uuid.UUID(row_id))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid Cursor")
+
+
+def list_page(cur, table: str, key_column: str, filters: dict, cursor, limit: int):
+    """Return one keyset page of table ordered by (key_column, id).
+
+    Rows after the cursor are found with a row comparison on (key_column, id), which
+    the (..., key_column, id) indexes answer with a single index seek, so deep pages
+    cost the same as the first one.
+    """
+    conditions = []
+    params = {'limit': limit + 1}
+    for column, value in filters.items():
+        if value is not None:
+            conditions.append(sql.SQL("{} = {}").format(sql.Identifier(column), sql.Placeholder(column)))
+            params[column] = str(value)
+
+    if cursor is not None:
+        params['after_key'], params['after_id'] = decode_cursor(cursor)
+        conditions.append(sql.SQL("({}, id) > (%(after_key)s::timestamptz, %(after_id)s::uuid)")
+                          .format(sql.Identifier(key_column)))
+
+    where = sql.SQL("WHERE {}").format(sql.SQL(" AND ").join(conditions)) if conditions else sql.SQL("")
+    cur.execute(sql.SQL("""
+        SELECT *
+        FROM {}
+        {}
+        ORDER BY {}, id
+        LIMIT %(limit)s
+        """).format(sql.Identifier(table), where, sql.Identifier(key_column)), params)
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][key_column], rows[-1]['id'])
+
+    return {'items': rows, 'next_cursor': next_cursor}
@@ -0,0 +1,36 @@
+from fastapi import HTTPException
+from psycopg2 import sql
+
+# Columns a PATCH body may set, per table. Anything else (id, created_at,
+# updated_at, unknown keys) is rejected before any SQL is built.
+PATCH_COLUMNS = {
+    'users': ('personal_identificator', 'name', 'surname', 'email', 'birth_date'),
+    'cards': ('user_id', 'magstripe', 'status'),
+    'publication_instances': ('publication_id', 'publisher', 'type', 'status', 'year'),
+    'authors': ('name', 'surname'),
+    'categories': ('name',),
+}
+
+
+def patch_row(cur, table: str, row_id, update_values: dict):
+    """Apply a PATCH body as a single UPDATE ... RETURNING * and return the row (None if missing)."""
+    if not isinstance(update_values, dict):
+        raise HTTPException(status_code=400, detail="Bad Request")
+
+    columns = PATCH_COLUMNS[table]
+    for key in update_values:
+        if key not in columns:
+            raise HTTPException(status_code=400, detail="Bad Request")
+
+    assignments = [sql.SQL("{} = {}").format(sql.Identifier(key), sql.Placeholder(key))
+                   for key in update_values]
+    assignments.append(sql.SQL("updated_at = now()"))
+
+    cur.execute(sql.SQL("""
+        UPDATE {}
+        SET {}
+        WHERE id = %(row_id)s
+        RETURNING *
+        """).format(sql.Identifier(table), sql.SQL(', ').join(assignments)),
+                {**update_values, 'row_id': str(row_id)})
+    return cur.fetchone()
@@ -0,0 +1,543 @@
+import re
+import textwrap
+import threading
+import time
+
+import psycopg2.errors
+import psycopg2.extensions
+
+# %(name)s placeholders, with an optional ::type (or ::type[]) cast right after them.
+PLACEHOLDER = re.compile(r"%\((\w+)\)s((?:::\w+(?:\[\])?)?)")
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Connection that remembers which registry statements have been PREPAREd on it.
+
+    Prepared statements belong to the server session, so the set lives and dies with
+    the connection: a connection the pool replaces starts empty and prepares again.
+    ``generation`` is the registry generation the set was prepared under.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.generation = 0
+
+
+class StalePreparedStatement(Exception):
+    """A prepared statement's result columns changed under it (a migration ran).
+
+    The transaction is aborted; run_in_transaction retries it once, and the retry
+    prepares every statement afresh.
+    """
+
+
+class Query:
+    """A named statement, written with psycopg2 %(name)s placeholders.
+
+    The text is turned into ``PREPARE <name> AS ...`` with positional $n parameters
+    (casts are kept on both sides, so ``%(ids)s::uuid[]`` accepts a Python list) and
+    an ``EXECUTE <name> (...)`` that psycopg2 fills in from the same params dict.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = textwrap.dedent(text).strip()
+
+        casts = {}
+
+        def number(match):
+            parameter, cast = match.group(1), match.group(2)
+            if cast or parameter not in casts:
+                casts[parameter] = cast
+            return "${}{}".format(list(casts).index(parameter) + 1, cast)
+
+        body = PLACEHOLDER.sub(number, self.text).replace('%%', '%')
+        self.prepare_sql = "PREPARE {} AS {}".format(name, body)
+        if casts:
+            arguments = ", ".join("%({})s{}".format(parameter, cast) for parameter, cast in casts.items())
+            self.execute_sql = "EXECUTE {} ({})".format(name, arguments)
+        else:
+            self.execute_sql = "EXECUTE {}".format(name)
+
+
+class QueryRegistry:
+    """All statements the request handlers run, with per-statement call counters."""
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._seconds = {}
+        self._prepares = {}
+        # Bumped when a prepared statement goes stale; every connection then drops
+        # its prepared statements before its next EXECUTE.
+        self.generation = 0
+
+    def register(self, name: str, text: str) -> Query:
+        if name in self._queries:
+            raise ValueError("Query {} is already registered".format(name))
+        query = self._queries[name] = Query(name, text)
+        self._calls[name] = self._prepares[name] = 0
+        self._seconds[name] = 0.0
+        return query
+
+    def get(self, name: str):
+        return self._queries.get(name)
+
+    def execute(self, cur, query: Query, params=None):
+        """Run ``query`` on ``cur``, preparing it first if this connection has not yet."""
+        started = time.perf_counter()
+        prepared = getattr(cur.connection, 'prepared', None)
+        if prepared is None:
+            # Not a pooled connection (e.g. a script's own psycopg2.connect).
+            cur.execute(query.text, params)
+        else:
+            connection = cur.connection
+            if connection.generation != self.generation:
+                cur.execute("DEALLOCATE ALL")
+                prepared.clear()
+                connection.generation = self.generation
+            if query.name not in prepared:
+                cur.execute(query.prepare_sql)
+                prepared.add(query.name)
+                with self._lock:
+                    self._prepares[query.name] += 1
+            try:
+                cur.execute(query.execute_sql, params)
+            except psycopg2.errors.FeatureNotSupported as error:
+                # "cached plan must not change result type": the other connections
+                # hold the same outdated statements.
+                with self._lock:
+                    self.generation = max(self.generation, connection.generation + 1)
+                raise StalePreparedStatement(query.name) from error
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._calls[query.name] += 1
+            self._seconds[query.name] += elapsed
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'calls': self._calls[name],
+                    'prepares': self._prepares[name],
+                    'total_ms': round(self._seconds[name] * 1000, 3),
+                    'mean_ms': round(self._seconds[name] * 1000 / self._calls[name], 3) if self._calls[name] else None,
+                }
+                for name in self._queries
+            }
+
+
+registry = QueryRegistry()
+execute = registry.execute
+
+
+# The user and publication documents are built whole in Postgres and returned as one
+# json text value, which the handlers send as is, together with the document's ETag
+# validator (migrations 0011 and 0013). {} is the WHERE condition picking the rows.
+USER_DOCUMENT = """
+    SELECT users.id, json_strip_nulls(row_to_json(sel_user))::text AS body, user_etag(users.id) AS etag
+    FROM users
+    CROSS JOIN LATERAL (
+      SELECT users.*,
+      (SELECT JSON_AGG(JSON_BUILD_OBJECT('id', reservations.id, 'user_id', reservations.user_id,
+                                         'publication_id', reservations.publication_id))
+       FROM reservations WHERE reservations.user_id = users.id) AS reservations,
+      (SELECT JSON_AGG(JSON_BUILD_OBJECT('id', publication_loans.id, 'user_id', publication_loans.user_id,
+                                         'publication_instance_id', publication_loans.publication_instance_id,
+                                         'duration', publication_loans.duration,
+                                         'status', publication_loans.status))
+       FROM publication_loans WHERE publication_loans.user_id = users.id) AS rentals) AS sel_user
+    WHERE {}
+"""
+
+USER_GET = registry.register('user_get', USER_DOCUMENT.format("users.id = (%(userID)s)"))
+
+USERS_BATCH_GET = registry.register('users_batch_get', USER_DOCUMENT.format("users.id = ANY(%(ids)s::uuid[])"))
+
+USER_ETAG = registry.register('user_etag', """
+    SELECT user_etag(users.id) AS etag
+    FROM users WHERE users.id = (%(userID)s)
+""")
+
+USER_INSERT = registry.register('user_insert', """
+    INSERT INTO users
+    VALUES((%(id)s), (%(personal_identificator)s), (%(name)s), (%(surname)s),
+    (%(email)s), (%(birth_date)s), now(), now())
+    RETURNING id, personal_identificator, name, surname, email, birth_date, created_at, updated_at
+""")
+
+CARD_GET = registry.register('card_get', """
+    SELECT id, user_id, magstripe, status, created_at, updated_at
+    FROM cards
+    WHERE cards.id=(%(cardID)s)
+""")
+
+CARD_INSERT = registry.register('card_insert', """
+    INSERT INTO cards
+    VALUES((%(id)s), (%(user_id)s), (%(magstripe)s), (%(status)s), now(), now())
+    RETURNING id, user_id, magstripe, status, created_at, updated_at
+""")
+
+CARD_DELETE = registry.register('card_delete', """
+    DELETE FROM cards WHERE cards.id = (%(cardID)s)
+    RETURNING id, user_id, magstripe, status, created_at, updated_at
+""")
+
+PUBLICATION_DOCUMENT = """
+    SELECT publications.id, row_to_json(pub)::text AS body, publication_etag(publications.id) AS etag
+    FROM publications
+    CROSS JOIN LATERAL (
+      SELECT publications.*,
+      (SELECT JSON_AGG(JSON_BUILD_OBJECT('name', authors.name, 'surname', authors.surname))
+       FROM authors
+       JOIN publication_authors ON publication_authors.author_id = authors.id
+       WHERE publication_authors.publication_id = publications.id) AS authors,
+      (SELECT ARRAY_AGG(categories.name)
+       FROM categories
+       JOIN publication_categories ON publication_categories.category_id = categories.id
+       WHERE publication_categories.publication_id = publications.id) AS categories,
+      COALESCE((SELECT JSON_OBJECT_AGG(publication_availability.type,
+                                       JSON_BUILD_OBJECT('available', publication_availability.available,
+                                                         'reserved', publication_availability.reserved))
+                FROM publication_availability
+                WHERE publication_availability.publication_id = publications.id), '{{}}') AS availability) AS pub
+    WHERE {}
+"""
+
+PUBLICATION_GET = registry.register('publication_get', PUBLICATION_DOCUMENT.format("publications.id = (%(publicationId)s)"))
+
+PUBLICATIONS_BATCH_GET = registry.register('publications_batch_get',
+                                           PUBLICATION_DOCUMENT.format("publications.id = ANY(%(ids)s::uuid[])"))
+
+PUBLICATION_ETAG = registry.register('publication_etag', """
+    SELECT publication_etag(publications.id) AS etag
+    FROM publications WHERE publications.id = (%(publicationId)s)
+""")
+
+PUBLICATIONS_AVAILABILITY = registry.register('publications_availability', """
+    SELECT publication_id, type, available, reserved
+    FROM publication_availability
+    WHERE publication_id = ANY(%(publication_ids)s::uuid[])
+""")
+
+PUBLICATION_AUTHORS_LINK = registry.register('publication_authors_link', """
+    INSERT INTO publication_authors (publication_id, author_id)
+    SELECT linked.publication_id, authors.id
+    FROM unnest(%(publication_ids)s::uuid[], %(names)s::text[], %(surnames)s::text[])
+    AS linked(publication_id, name, surname)
+    LEFT JOIN authors ON authors.name = linked.name AND authors.surname = linked.surname
+""")
+
+PUBLICATION_CATEGORIES_LINK = registry.register('publication_categories_link', """
+    INSERT INTO publication_categories (category_id, publication_id)
+    SELECT categories.id, linked.publication_id
+    FROM unnest(%(publication_ids)s::uuid[], %(names)s::text[])
+    AS linked(publication_id, name)
+    LEFT JOIN categories ON categories.name = linked.name
+""")
+
+PUBLICATION_INSERT = registry.register('publication_insert', """
+    INSERT INTO publications
+    VALUES((%(id)s), (%(title)s), now(), now())
+    RETURNING id, title, created_at, updated_at
+""")
+
+PUBLICATIONS_BULK_INSERT = registry.register('publications_bulk_insert', """
+    INSERT INTO publications
+    SELECT loaded.id, loaded.title, now(), now()
+    FROM unnest(%(ids)s::uuid[], %(titles)s::text[]) AS loaded(id, title)
+""")
+
+PUBLICATION_DELETE = registry.register('publication_delete', """
+    DELETE FROM publications WHERE publications.id = (%(publicationId)s)
+    RETURNING id, title, created_at, updated_at
+""")
+
+PUBLICATION_SEARCH = registry.register('publication_search', """
+    WITH matches AS (
+      SELECT publication_id, ts_rank_cd(document, query)::float8 AS rank
+      FROM publication_search, websearch_to_tsquery('simple', %(q)s) AS query
+      WHERE document @@ query)
+    SELECT publications.id, publications.title, publications.created_at, publications.updated_at,
+    matches.rank
+    FROM matches
+    JOIN publications ON publications.id = matches.publication_id
+    WHERE %(after_rank)s::float8 IS NULL
+    OR (matches.rank, matches.publication_id) < (%(after_rank)s::float8, %(after_id)s::uuid)
+    ORDER BY matches.rank DESC, matches.publication_id DESC
+    LIMIT %(limit)s
+""")
+
+# Needs pg_trgm; only executed when TRIGRAM_AVAILABLE says the extension is installed.
+PUBLICATION_FUZZY_SEARCH = registry.register('publication_fuzzy_search', """
+    WITH matches AS (
+      SELECT publication_id, word_similarity(lower(%(q)s::text), terms)::float8 AS rank
+      FROM publication_search
+      WHERE lower(%(q)s::text) <%% terms)
+    SELECT publications.id, publications.title, publications.created_at, publications.updated_at,
+    matches.rank
+    FROM matches
+    JOIN publications ON publications.id = matches.publication_id
+    WHERE %(after_rank)s::float8 IS NULL
+    OR (matches.rank, matches.publication_id) < (%(after_rank)s::float8, %(after_id)s::uuid)
+    ORDER BY matches.rank DESC, matches.publication_id DESC
+    LIMIT %(limit)s
+""")
+
+TRIGRAM_AVAILABLE = registry.register('trigram_available', """
+    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS available
+""")
+
+INSTANCE_GET = registry.register('instance_get', """
+    SELECT id, publication_id, publisher, type, status, year, created_at, updated_at
+    FROM publication_instances
+    WHERE publication_instances.id=(%(instanceId)s)
+""")
+
+INSTANCES_BATCH_GET = registry.register('instances_batch_get', """
+    SELECT id, publication_id, publisher, type, status, year, created_at, updated_at
+    FROM publication_instances
+    WHERE publication_instances.id = ANY(%(ids)s::uuid[])
+""")
+
+INSTANCE_INSERT = registry.register('instance_insert', """
+    INSERT INTO publication_instances
+    VALUES((%(id)s), (%(publication_id)s), (%(publisher)s), (%(type)s), (%(status)s),
+    (%(year)s), now(), now())
+    RETURNING id, publication_id, publisher, type, status, year, created_at, updated_at
+""")
+
+INSTANCE_DELETE = registry.register('instance_delete', """
+    DELETE FROM publication_instances WHERE publication_instances.id = (%(instanceId)s)
+    RETURNING id, publication_id, publisher, type, status, year, created_at, updated_at
+""")
+
+AUTHOR_INSERT = registry.register('author_insert', """
+    INSERT INTO authors
+    VALUES((%(id)s), (%(name)s), (%(surname)s), now(), now())
+    RETURNING id, name, surname, created_at, updated_at
+""")
+
+AUTHOR_GET = registry.register('author_get', """
+    SELECT id, name, surname, created_at, updated_at
+    FROM authors
+    WHERE authors.id=(%(authorId)s)
+""")
+
+AUTHOR_DELETE = registry.register('author_delete', """
+    DELETE FROM authors WHERE authors.id = (%(authorId)s)
+    RETURNING id, name, surname, created_at, updated_at
+""")
+
+# Publications linked to an author or a category, for cache invalidation.
+AUTHOR_PUBLICATIONS = registry.register('author_publications', """
+    SELECT publication_id FROM publication_authors WHERE author_id = %(row_id)s
+""")
+
+CATEGORY_PUBLICATIONS = registry.register('category_publications', """
+    SELECT publication_id FROM publication_categories WHERE category_id = %(row_id)s
+""")
+
+CATEGORY_INSERT = registry.register('category_insert', """
+    INSERT INTO categories
+    VALUES((%(id)s), (%(name)s), now(), now())
+    RETURNING id, name, created_at, updated_at
+""")
+
+CATEGORY_GET = registry.register('category_get', """
+    SELECT id, name, created_at, updated_at
+    FROM categories
+    WHERE categories.id=(%(categoryId)s)
+""")
+
+CATEGORY_DELETE = registry.register('category_delete', """
+    DELETE FROM categories WHERE categories.id = (%(categoryId)s)
+    RETURNING id, name, created_at, updated_at
+""")
+
+RENTAL_INSERT = registry.register('rental_insert', """
+    WITH claimed AS (
+      DELETE FROM reservations
+      WHERE reservations.id = (
+        SELECT id FROM reservations
+        WHERE user_id=(%(user_id)s)
+        AND publication_id=(%(publication_id)s)
+        AND publication_instance_id IS NOT NULL
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE)
+      RETURNING publication_instance_id AS id, 'physical'::text AS type),
+    physical AS (
+      SELECT id, type FROM publication_instances
+      WHERE publication_id=(%(publication_id)s)
+      AND status='available'
+      AND type='physical'
+      AND NOT EXISTS (SELECT 1 FROM claimed)
+      LIMIT 1
+      FOR UPDATE SKIP LOCKED),
+    digital AS (
+      SELECT id, type FROM publication_instances
+      WHERE publication_id=(%(publication_id)s)
+      AND status='available'
+      AND type<>'physical'
+      AND NOT EXISTS (SELECT 1 FROM claimed)
+      AND NOT EXISTS (SELECT 1 FROM physical)
+      LIMIT 1),
+    picked AS (SELECT * FROM claimed UNION ALL SELECT * FROM physical UNION ALL SELECT * FROM digital),
+    reserved AS (
+      UPDATE publication_instances
+      SET updated_at=now(),
+      status='reserved'
+      FROM physical
+      WHERE publication_instances.id=physical.id)
+    INSERT INTO publication_loans (id, user_id, publication_instance_id, start_date, end_date, duration)
+    SELECT (%(id)s), (%(user_id)s), picked.id, now(),
+    now() + make_interval(days => %(duration)s), (%(duration)s)
+    FROM picked
+    RETURNING id, user_id, publication_instance_id, start_date, end_date, duration, status, updated_at
+""")
+
+RENTALS_RETURN = registry.register('rentals_return', """
+    WITH requested AS (
+      SELECT publication_loans.id
+      FROM publication_loans
+      JOIN unnest(%(loan_ids)s::uuid[]) AS loan(id) ON publication_loans.id = loan.id
+      UNION
+      SELECT publication_loans.id
+      FROM publication_loans
+      JOIN unnest(%(instance_ids)s::uuid[]) AS instance(id)
+      ON publication_loans.publication_instance_id = instance.id
+      -- A digital copy has a loan per patron, so its id does not name one loan.
+      JOIN publication_instances ON publication_instances.id = instance.id
+      WHERE publication_instances.type = 'physical'),
+    returned AS (
+      UPDATE publication_loans
+      SET status='returned',
+      updated_at=now()
+      FROM requested
+      WHERE publication_loans.id = requested.id
+      AND publication_loans.status IN ('active', 'overdue')
+      RETURNING publication_loans.id, publication_loans.publication_instance_id),
+    freed AS (
+      UPDATE publication_instances
+      SET status='available',
+      updated_at=now()
+      FROM returned
+      WHERE publication_instances.id = returned.publication_instance_id
+      AND publication_instances.type='physical'
+      RETURNING publication_instances.id, publication_instances.publication_id)
+    SELECT returned.id AS loan_id, returned.publication_instance_id,
+    freed.id IS NOT NULL AS freed, freed.publication_id
+    FROM returned
+    LEFT JOIN freed ON freed.id = returned.publication_instance_id
+""")
+
+RENTAL_GET = registry.register('rental_get', """
+    SELECT duration, id, publication_instance_id, status, user_id
+    FROM publication_loans
+    WHERE publication_loans.id=(%(rentalId)s)
+""")
+
+RENTALS_BATCH_GET = registry.register('rentals_batch_get', """
+    SELECT duration, id, publication_instance_id, status, user_id
+    FROM publication_loans
+    WHERE publication_loans.id = ANY(%(ids)s::uuid[])
+""")
+
+RESERVATION_INSERT = registry.register('reservation_insert', """
+    INSERT INTO reservations
+    VALUES((%(id)s), (%(publication_id)s), (%(user_id)s), now())
+    RETURNING id, publication_id, user_id, created_at, publication_instance_id
+""")
+
+AVAILABLE_COPY_LOCK = registry.register('available_copy_lock', """
+    SELECT id FROM publication_instances
+    WHERE publication_id=(%(publication_id)s)
+    AND status='available'
+    AND type='physical'
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+""")
+
+RESERVATION_GET = registry.register('reservation_get', """
+    SELECT id, publication_id, user_id, created_at, publication_instance_id
+    FROM reservations
+    WHERE reservations.id=(%(reservationId)s)
+""")
+
+RESERVATION_DELETE = registry.register('reservation_delete', """
+    DELETE FROM reservations WHERE reservations.id = (%(reservationId)s)
+    RETURNING id, publication_id, user_id, created_at, publication_instance_id
+""")
+
+INSTANCE_RELEASE = registry.register('instance_release', """
+    UPDATE publication_instances
+    SET status='available',
+    updated_at=now()
+    WHERE id=(%(instanceId)s)
+""")
+
+# Kept by the reservations triggers of migration 0012.
+QUEUE_LENGTH = registry.register('queue_length', """
+    SELECT coalesce((SELECT waiting FROM publication_queue
+                     WHERE publication_id=(%(publicationId)s)), 0) AS length
+""")
+
+QUEUE_POSITION = registry.register('queue_position', """
+    WITH mine AS (
+      SELECT id, created_at, publication_instance_id
+      FROM reservations
+      WHERE publication_id=(%(publicationId)s)
+      AND user_id=(%(userId)s)
+      ORDER BY publication_instance_id IS NULL, created_at
+      LIMIT 1)
+    SELECT mine.publication_instance_id,
+    (SELECT count(*) + 1
+     FROM reservations ahead
+     WHERE ahead.publication_id=(%(publicationId)s)
+     AND ahead.publication_instance_id IS NULL
+     AND (ahead.created_at, ahead.id) < (mine.created_at, mine.id)) AS position
+    FROM mine
+""")
+
+FULFIL_RESERVATIONS = registry.register('fulfil_reservations', """
+    WITH freed AS (
+      SELECT id, publication_id FROM publication_instances
+      WHERE id = ANY(%(instance_ids)s::uuid[])
+      AND status='available'
+      AND type='physical'
+      FOR UPDATE),
+    numbered_copies AS (
+      SELECT id, publication_id,
+      row_number() OVER (PARTITION BY publication_id ORDER BY id) AS position
+      FROM freed),
+    demand AS (
+      SELECT publication_id, count(*) AS copies FROM freed GROUP BY publication_id),
+    queued AS (
+      SELECT next.id, next.publication_id,
+      row_number() OVER (PARTITION BY next.publication_id ORDER BY next.created_at, next.id) AS position
+      FROM demand
+      CROSS JOIN LATERAL (
+        SELECT id, publication_id, created_at FROM reservations
+        WHERE reservations.publication_id = demand.publication_id
+        AND reservations.publication_instance_id IS NULL
+        ORDER BY created_at, id
+        LIMIT demand.copies
+        FOR UPDATE SKIP LOCKED) AS next),
+    held AS (
+      UPDATE reservations
+      SET publication_instance_id = numbered_copies.id
+      FROM queued
+      JOIN numbered_copies USING (publication_id, position)
+      WHERE reservations.id = queued.id
+      RETURNING reservations.id, reservations.user_id, reservations.publication_instance_id)
+    UPDATE publication_instances
+    SET status='reserved',
+    updated_at=now()
+    FROM held
+    WHERE publication_instances.id = held.publication_instance_id
+    RETURNING held.id AS reservation_id, held.user_id, held.publication_instance_id
+""")
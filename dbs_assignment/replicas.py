@@ -0,0 +1,61 @@
+import math
+from contextvars import ContextVar
+
+from starlette.requests import cookie_parser
+
+from dbs_assignment.config import settings
+
+# Set after a client's write; while the cookie lives, its reads go to the primary.
+PIN_COOKIE = 'dbs_primary'
+
+
+class RequestRouting:
+    """Replica routing state of one HTTP request."""
+
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned: bool):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# run_in_transaction copies the context into the database thread, so the routing
+# decision sees `pinned` and a committed write transaction can set `wrote`.
+current_routing: ContextVar = ContextVar('current_routing', default=None)
+
+
+class PrimaryPinMiddleware:
+    """ASGI middleware giving each client read-your-writes consistency over a lagging replica.
+
+    A request that committed a write transaction is answered with a short-lived
+    PIN_COOKIE; requests carrying it read from the primary until it expires
+    (READ_YOUR_WRITES_SECONDS).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.set_cookie = '{}=1; Max-Age={}; Path=/; HttpOnly; SameSite=Lax'.format(
+            PIN_COOKIE, math.ceil(settings.READ_YOUR_WRITES_SECONDS)).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        # cookie_parser skips malformed pairs; SimpleCookie would drop every cookie
+        # after the first one, PIN_COOKIE included.
+        cookies = {}
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookies.update(cookie_parser(value.decode('latin-1')))
+        routing = RequestRouting(PIN_COOKIE in cookies)
+        token = current_routing.set(routing)
+
+        async def send_with_pin(message):
+            if message['type'] == 'http.response.start' and routing.wrote:
+                message['headers'] = list(message.get('headers', [])) + [(b'set-cookie', self.set_cookie)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            current_routing.reset(token)
@@ -0,0 +1,18 @@
+from dbs_assignment import queries
+from dbs_assignment.queries import execute
+
+
+def fulfil_reservations(cur, instance_ids):
+    """Hold freshly available physical copies for the oldest waiting reservations.
+
+    Runs in the caller's transaction, so a return and the hand-over to the queue
+    commit together. For each publication the engine takes as many queued
+    reservations as copies were freed, straight off reservations_queue_idx (one
+    index seek per publication, independent of the queue length), links each to a
+    copy and marks the copy 'reserved'. Returns the holds that were made.
+    """
+    if not instance_ids:
+        return []
+
+    execute(cur, queries.FULFIL_RESERVATIONS, {'instance_ids': [str(instance_id) for instance_id in instance_ids]})
+    return cur.fetchall()
@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 
-from dbs_assignment.endpoints import hello
+from dbs_assignment.endpoints import export, hello, stats
 
 router = APIRouter()
 router.include_router(hello.router, tags=["hello"])
+router.include_router(export.router, tags=["export"])
+router.include_router(stats.router, tags=["stats"])
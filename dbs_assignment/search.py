@@ -0,0 +1,67 @@
+import threading
+
+from fastapi import HTTPException
+
+from dbs_assignment import queries
+from dbs_assignment.pagination import decode_cursor, encode_cursor
+from dbs_assignment.queries import execute
+
+MODES = {'text': queries.PUBLICATION_SEARCH, 'fuzzy': queries.PUBLICATION_FUZZY_SEARCH}
+
+_trigram = None
+_trigram_lock = threading.Lock()
+
+
+def trigram_available(cur) -> bool:
+    """Whether pg_trgm is installed; asked once per process (migration 0009 installs it when it can)."""
+    global _trigram
+    if _trigram is None:
+        with _trigram_lock:
+            if _trigram is None:
+                execute(cur, queries.TRIGRAM_AVAILABLE)
+                _trigram = cur.fetchone()['available']
+    return _trigram
+
+
+def parse_search_key(key):
+    """A search cursor's key is [mode, rank]; raises ValueError or TypeError otherwise."""
+    if not (isinstance(key, list) and len(key) == 2):
+        raise TypeError("search cursor key is not [mode, rank]")
+    mode, rank = key
+    if not isinstance(mode, str) or mode not in MODES:
+        raise ValueError("unknown search mode")
+    if isinstance(rank, bool) or not isinstance(rank, (int, float)):
+        raise TypeError("search cursor rank is not a number")
+    return mode, float(rank)
+
+
+def search_publications(cur, q: str, cursor, limit: int):
+    """Return one page of publications matching q, best match first.
+
+    Full-text matches over publication_search (title, author and category names) are
+    ranked with ts_rank_cd. When nothing matches and pg_trgm is installed, the query is
+    retried by trigram word similarity, so "tolkein" still finds Tolkien. Pages are
+    keyed on (rank, id); the cursor also carries the mode, so later pages of a fuzzy
+    search stay fuzzy.
+    """
+    params = {'q': q, 'limit': limit + 1, 'after_rank': None, 'after_id': None}
+    mode = 'text'
+    if cursor is not None:
+        (mode, params['after_rank']), params['after_id'] = decode_cursor(cursor, parse_key=parse_search_key)
+        if mode == 'fuzzy' and not trigram_available(cur):
+            # Only a forged cursor can ask for fuzzy pages where pg_trgm is missing.
+            raise HTTPException(status_code=400, detail="Invalid Cursor")
+
+    execute(cur, MODES[mode], params)
+    rows = cur.fetchall()
+    if not rows and cursor is None and trigram_available(cur):
+        mode = 'fuzzy'
+        execute(cur, MODES[mode], params)
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([mode, rows[-1]['rank']], rows[-1]['id'])
+
+    return {'items': rows, 'mode': mode, 'next_cursor': next_cursor}
@@ -0,0 +1,142 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import threading
+import time
+
+import psycopg2
+
+from dbs_assignment.config import settings
+from dbs_assignment.queries import registry
+
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUPS = 5
+
+# Statements EXPLAIN accepts; utility statements (PREPARE, COPY, CREATE, LISTEN...) are only logged.
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+REGISTRY_STATEMENT = re.compile(r"^\s*(EXECUTE|PREPARE)\s+(\w+)", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def redact(value):
+    """Replace parameter values by their type (and length), keeping the names."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [redact(item) for item in value]
+    if value is None:
+        return None
+    if isinstance(value, (str, list, bytes)):
+        return "<{}:{}>".format(type(value).__name__, len(value))
+    return "<{}>".format(type(value).__name__)
+
+
+class SlowQueryLog:
+    """Logs statements slower than SLOW_QUERY_MS and EXPLAINs a sample of them.
+
+    Entries are JSON lines in a rotating file. EXPLAIN (ANALYZE, BUFFERS) runs on a
+    background thread over its own read-only connection, so a slow request is not
+    made slower. Writes and FOR UPDATE statements are refused by the read-only
+    transaction before they take any row lock (an analyzed rental would otherwise
+    make a concurrent one skip the copy); for those only the plan is logged.
+    """
+
+    def __init__(self, threshold_ms: float, explain_sample: float, path: str):
+        self.threshold = threshold_ms / 1000
+        self.explain_sample = explain_sample
+        self.path = path
+        self._file_logger = None
+        self._jobs = queue.Queue(maxsize=100)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _write(self, entry: dict):
+        if self._file_logger is None:
+            with self._lock:
+                if self._file_logger is None:
+                    file_logger = logging.getLogger(__name__ + '.file')
+                    file_logger.propagate = False
+                    file_logger.setLevel(logging.INFO)
+                    file_logger.addHandler(logging.handlers.RotatingFileHandler(
+                        self.path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS))
+                    self._file_logger = file_logger
+        self._file_logger.info(json.dumps(entry, default=str))
+
+    def record(self, cur, query, params, seconds: float, route: str):
+        """Called by TimedCursor for every statement slower than the threshold."""
+        text = query if isinstance(query, str) else query.as_string(cur)
+        # Registry statements are logged under their name and original text.
+        name, preparing = None, False
+        statement = REGISTRY_STATEMENT.match(text)
+        if statement is not None and registry.get(statement.group(2)) is not None:
+            name, text = statement.group(2), registry.get(statement.group(2)).text
+            preparing = statement.group(1).upper() == 'PREPARE'
+
+        entry = {'at': time.time(), 'route': route, 'duration_ms': round(seconds * 1000, 2),
+                 'query': name, 'prepare': preparing, 'sql': normalize(text), 'params': redact(params)}
+        logger.warning("Slow query (%.1f ms) on %s: %s", seconds * 1000, route, name or entry['sql'][:200])
+        self._write(entry)
+
+        if not preparing and EXPLAINABLE.match(text) and random.random() < self.explain_sample:
+            try:
+                self._jobs.put_nowait((entry, text, params))
+            except queue.Full:
+                return
+            self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slow-query-explain', daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # Imported here: database imports metrics, which imports this module.
+        from dbs_assignment.database import connection_kwargs
+
+        connection = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            entry, text, params = job
+            try:
+                if connection is None or connection.closed:
+                    connection = psycopg2.connect(**connection_kwargs())
+                    connection.set_session(readonly=True)
+                analyzed = True
+                with connection.cursor() as cur:
+                    cur.execute("SET LOCAL statement_timeout = '30s'")
+                    try:
+                        cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + text, params)
+                    except psycopg2.errors.ReadOnlySqlTransaction:
+                        connection.rollback()
+                        analyzed = False
+                        cur.execute("EXPLAIN " + text, params)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                self._write({**entry, 'explained_at': time.time(), 'analyzed': analyzed, 'plan': plan})
+            except psycopg2.Error as error:
+                self._write({**entry, 'explained_at': time.time(), 'explain_error': str(error).strip()})
+            finally:
+                if connection is not None and not connection.closed:
+                    connection.rollback()
+        if connection is not None:
+            connection.close()
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_MS, settings.SLOW_QUERY_EXPLAIN_SAMPLE, settings.SLOW_QUERY_LOG_PATH)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+
+from dbs_assignment.config import settings
+from dbs_assignment.database import run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+
+def mark_overdue_batch(cur, batch_size: int) -> int:
+    cur.execute("""
+                WITH batch AS (
+                  SELECT id FROM publication_loans
+                  WHERE status='active'
+                  AND end_date < now()
+                  ORDER BY end_date
+                  LIMIT %(batch_size)s
+                  FOR UPDATE SKIP LOCKED)
+                UPDATE publication_loans
+                SET status='overdue',
+                updated_at=now()
+                FROM batch
+                WHERE publication_loans.id = batch.id
+                """, {'batch_size': batch_size})
+    return cur.rowcount
+
+
+class OverdueSweeper:
+    """Periodically flips expired active loans to 'overdue' in bounded batches.
+
+    Every batch is its own short transaction driven by the (status, end_date)
+    index, so a large backlog never holds locks on the loans table for long.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self.runs = 0
+        self.rows_total = 0
+        self.last_run_at = None
+        self.last_run_rows = 0
+        self.last_run_batches = 0
+        self.last_run_duration = None
+        self.last_error = None
+
+    async def sweep(self) -> int:
+        started = time.perf_counter()
+        self.last_run_at = time.time()
+        rows = batches = 0
+        while True:
+            updated = await run_in_transaction(mark_overdue_batch, self.batch_size)
+            rows += updated
+            batches += 1
+            if updated < self.batch_size:
+                break
+
+        self.runs += 1
+        self.rows_total += rows
+        self.last_run_rows = rows
+        self.last_run_batches = batches
+        self.last_run_duration = time.perf_counter() - started
+        return rows
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.sweep()
+                self.last_error = None
+            except Exception as error:
+                logger.exception("Overdue sweep failed")
+                self.last_error = repr(error)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'batch_size': self.batch_size,
+            'runs': self.runs,
+            'rows_total': self.rows_total,
+            'last_run_at': self.last_run_at,
+            'last_run_rows': self.last_run_rows,
+            'last_run_batches': self.last_run_batches,
+            'last_run_duration': self.last_run_duration,
+            'last_error': self.last_error,
+        }
+
+
+overdue_sweeper = OverdueSweeper(settings.OVERDUE_SWEEP_INTERVAL, settings.OVERDUE_SWEEP_BATCH_SIZE)
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+# Settings requires DATABASE_*, so modules that read it cannot be imported without them.
+# Placeholders fill in whatever is unset; only tests marked `database` connect, and they
+# are skipped unless a database was configured before the placeholders went in.
+DATABASE_CONFIGURED = all(os.environ.get(name) for name in
+                          ('DATABASE_NAME', 'DATABASE_HOST', 'DATABASE_PORT', 'DATABASE_USER'))
+
+for name, value in {'DATABASE_NAME': 'library', 'DATABASE_HOST': 'localhost', 'DATABASE_PORT': '5432',
+                    'DATABASE_USER': 'postgres', 'DATABASE_PASSWORD': ''}.items():
+    os.environ.setdefault(name, value)
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "database: needs the database named by DATABASE_*; skipped when unset")
+
+
+def pytest_collection_modifyitems(config, items):
+    if DATABASE_CONFIGURED:
+        return
+    skip = pytest.mark.skip(reason="DATABASE_* is not set")
+    for item in items:
+        if 'database' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,50 @@
+import json
+from uuid import UUID
+
+import pytest
+from fastapi import HTTPException
+
+from dbs_assignment.batch import batch_body, batch_ids, batch_response
+from dbs_assignment.config import settings
+
+FIRST = '6c3f2948-6d49-4a35-beba-ca9ad3583b6f'
+SECOND = '0b1d2f5e-38c5-4a4a-9e0e-6f1f4d2c9a11'
+THIRD = 'f47ac10b-58cc-4372-a567-0e02b2c3d479'
+
+
+def test_batch_body_splices_documents_in_request_order():
+    bodies = {SECOND: b'{"id":"second","tags":["a, b"]}', FIRST: b'{"id":"first","n":1}'}
+
+    body = batch_body(bodies, [FIRST, THIRD, SECOND])
+
+    assert body.index(FIRST.encode()) < body.index(SECOND.encode())
+    assert json.loads(body) == {
+        'items': {FIRST: {'id': 'first', 'n': 1}, SECOND: {'id': 'second', 'tags': ['a, b']}},
+        'missing': [THIRD],
+    }
+
+
+def test_batch_body_matches_batch_response():
+    documents = {FIRST: {'id': FIRST, 'name': 'Ann "A." Lee', 'rentals': None}}
+    bodies = {row_id: json.dumps(document).encode() for row_id, document in documents.items()}
+
+    assert json.loads(batch_body(bodies, [FIRST, SECOND])) == batch_response(documents, [FIRST, SECOND])
+
+
+@pytest.mark.parametrize('ids', [[], [FIRST]])
+def test_batch_body_with_nothing_found(ids):
+    assert json.loads(batch_body({}, ids)) == {'items': {}, 'missing': ids}
+
+
+def test_batch_ids_drops_duplicates_and_keeps_order():
+    assert batch_ids([UUID(SECOND), UUID(FIRST), UUID(SECOND)]) == [SECOND, FIRST]
+
+
+def test_batch_ids_caps_the_number_of_ids(monkeypatch):
+    monkeypatch.setattr(settings, 'BATCH_GET_MAX_IDS', 2)
+
+    assert batch_ids([UUID(FIRST), UUID(SECOND), UUID(FIRST)]) == [FIRST, SECOND]
+    with pytest.raises(HTTPException) as raised:
+        batch_ids([UUID(FIRST), UUID(SECOND), UUID(THIRD)])
+
+    assert raised.value.status_code == 400
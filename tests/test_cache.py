@@ -0,0 +1,99 @@
+import pytest
+
+from dbs_assignment import cache
+from dbs_assignment.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+def test_a_set_value_is_a_hit(clock):
+    lru = LRUCache(max_size=2, ttl=10)
+
+    lru.set('a', 1, lru.version)
+
+    assert lru.get('a') == 1
+    assert lru.get('b') is None
+    assert (lru.hits, lru.misses) == (1, 1)
+
+
+def test_the_least_recently_used_entry_is_evicted(clock):
+    lru = LRUCache(max_size=2, ttl=10)
+    lru.set('a', 1, lru.version)
+    lru.set('b', 2, lru.version)
+    lru.get('a')
+
+    lru.set('c', 3, lru.version)
+
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c')) == (1, 3)
+    assert lru.evictions == 1
+
+
+def test_an_entry_expires_after_its_ttl(clock):
+    lru = LRUCache(max_size=2, ttl=10)
+    lru.set('a', 1, lru.version)
+
+    clock.now += 10
+    assert lru.get('a') == 1
+
+    clock.now += 0.001
+    assert lru.get('a') is None
+    assert lru.expirations == 1
+    assert lru.stats()['size'] == 0
+
+
+def test_a_value_read_before_an_invalidation_is_not_cached(clock):
+    lru = LRUCache(max_size=2, ttl=10)
+    version = lru.version
+
+    lru.invalidate('a')
+    lru.set('a', 'stale', version)
+
+    assert lru.get('a') is None
+
+
+def test_clear_also_turns_away_values_read_before_it(clock):
+    lru = LRUCache(max_size=2, ttl=10)
+    lru.set('a', 1, lru.version)
+    version = lru.version
+
+    lru.clear()
+    lru.set('b', 'stale', version)
+
+    assert lru.get('a') is None
+    assert lru.get('b') is None
+    assert lru.invalidations == 1
+
+
+def test_invalidate_drops_only_the_named_keys(clock):
+    lru = LRUCache(max_size=3, ttl=10)
+    lru.set('a', 1, lru.version)
+    lru.set('b', 2, lru.version)
+
+    lru.invalidate('a', 'missing')
+
+    assert lru.get('a') is None
+    assert lru.get('b') == 2
+    assert lru.invalidations == 1
+
+
+def test_a_zero_size_cache_stores_nothing(clock):
+    lru = LRUCache(max_size=0, ttl=10)
+
+    lru.set('a', 1, lru.version)
+
+    assert lru.get('a') is None
+    assert lru.stats()['size'] == 0
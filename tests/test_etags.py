@@ -0,0 +1,34 @@
+import pytest
+
+from dbs_assignment.etags import etag_matches, strong_etag
+
+ETAG = strong_etag('25fd979c8860470f6705560944cec365')
+
+
+@pytest.mark.parametrize('if_none_match', [
+    ETAG,
+    'W/' + ETAG,
+    '*',
+    ' * ',
+    '"other", ' + ETAG,
+    'W/"other",W/' + ETAG + ' ',
+])
+def test_matching_headers(if_none_match):
+    assert etag_matches(if_none_match, ETAG)
+
+
+@pytest.mark.parametrize('if_none_match', [
+    None,
+    '',
+    '"other"',
+    'W/"other", "another"',
+    ETAG.strip('"'),
+    ETAG[:-2] + '"',
+    '"*"',
+])
+def test_headers_that_do_not_match(if_none_match):
+    assert not etag_matches(if_none_match, ETAG)
+
+
+def test_strong_etag_quotes_the_validator():
+    assert strong_etag('abc') == '"abc"'
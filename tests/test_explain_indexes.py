@@ -0,0 +1,71 @@
+"""The hot lookups are planned against the indexes from the migrations.
+
+Needs a migrated database named by the DATABASE_* environment variables; skipped
+without one (see conftest.py). Sequential scans are disabled so the plans are
+meaningful on a small or empty database.
+"""
+import uuid
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from dbs_assignment import queries
+from dbs_assignment.database import connection_kwargs
+
+pytestmark = pytest.mark.database
+
+ID = str(uuid.uuid4())
+
+# (handler, expected index, statement, params). Statements are the registered ones the
+# handlers run; the cascade lookups are what Postgres runs for ON DELETE CASCADE.
+CHECKS = [
+    ("users_get rentals", "publication_loans_user_id_start_date_id_idx",
+     queries.USER_GET.text, {'userID': ID}),
+    ("users_get reservations", "reservations_user_id_created_at_id_idx",
+     queries.USER_GET.text, {'userID': ID}),
+    ("publications_get authors", "publication_authors_publication_id_idx",
+     queries.PUBLICATION_GET.text, {'publicationId': ID}),
+    ("publications_get categories", "publication_categories_publication_id_idx",
+     queries.PUBLICATION_GET.text, {'publicationId': ID}),
+    ("publications_delete cascade", "publication_instances_publication_id_created_at_id_idx",
+     "SELECT id FROM publication_instances WHERE publication_id = %(id)s", {'id': ID}),
+    ("publications_delete cascade", "reservations_publication_id_created_at_id_idx",
+     "SELECT id FROM reservations WHERE publication_id = %(id)s", {'id': ID}),
+    ("rentals_post allocation", "publication_instances_available_idx",
+     queries.RENTAL_INSERT.text, {'id': ID, 'user_id': ID, 'publication_id': ID, 'duration': 7}),
+    ("rentals_returns hand-over", "reservations_queue_idx",
+     queries.FULFIL_RESERVATIONS.text, {'instance_ids': [ID]}),
+    ("publications_queue_get position", "reservations_queue_idx",
+     queries.QUEUE_POSITION.text, {'publicationId': ID, 'userId': ID}),
+]
+
+
+def plan_indexes(node):
+    found = set()
+    if 'Index Name' in node:
+        found.add(node['Index Name'])
+    for child in node.get('Plans', []):
+        found |= plan_indexes(child)
+    return found
+
+
+@pytest.fixture(scope='module')
+def cur():
+    connection = psycopg2.connect(**connection_kwargs())
+    try:
+        cur = connection.cursor(cursor_factory=RealDictCursor)
+        cur.execute("SET enable_seqscan = off")
+        yield cur
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+@pytest.mark.parametrize('name, index, query, params', CHECKS, ids=[f"{name}: {index}" for name, index, _, _ in CHECKS])
+def test_lookup_uses_index(cur, name, index, query, params):
+    # Plain EXPLAIN plans without running, so the INSERT writes nothing.
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()['QUERY PLAN'][0]['Plan']
+
+    assert index in plan_indexes(plan)
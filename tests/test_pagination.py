@@ -0,0 +1,53 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from dbs_assignment.pagination import decode_cursor, encode_cursor
+
+ROW_ID = '6c3f2948-6d49-4a35-beba-ca9ad3583b6f'
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def test_a_cursor_round_trips():
+    key = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+    assert decode_cursor(encode_cursor(key, ROW_ID)) == (key, ROW_ID)
+
+
+def test_the_id_comes_back_in_canonical_form():
+    assert decode_cursor(raw_cursor(['2024-05-01', ROW_ID.upper()]))[1] == ROW_ID
+
+
+@pytest.mark.parametrize('cursor', [
+    'garbage!!',
+    raw_cursor(5),
+    raw_cursor({'a': 1, 'b': 2}),
+    raw_cursor(['2024-05-01']),
+    raw_cursor(['2024-05-01', ROW_ID, 'extra']),
+    raw_cursor([5, ROW_ID]),
+    raw_cursor([None, ROW_ID]),
+    raw_cursor(['yesterday', ROW_ID]),
+    raw_cursor(['2024-05-01', 5]),
+    raw_cursor(['2024-05-01', None]),
+    raw_cursor(['2024-05-01', ['a']]),
+    raw_cursor(['2024-05-01', {'a': 1}]),
+    raw_cursor(['2024-05-01', 'not-a-uuid']),
+])
+def test_a_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+
+    assert raised.value.status_code == 400
+
+
+def test_parse_key_decides_what_a_key_may_be():
+    assert decode_cursor(raw_cursor([7, ROW_ID]), parse_key=int) == (7, ROW_ID)
+
+    with pytest.raises(HTTPException):
+        decode_cursor(raw_cursor(['seven', ROW_ID]), parse_key=int)
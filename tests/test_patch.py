@@ -0,0 +1,97 @@
+import pytest
+from fastapi import HTTPException
+from psycopg2 import sql
+
+from dbs_assignment.patch import PATCH_COLUMNS, patch_row
+
+ROW_ID = '6c3f2948-6d49-4a35-beba-ca9ad3583b6f'
+
+
+class RecordingCursor:
+    """Stands in for a cursor: keeps what would have been executed and returns no row."""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return None
+
+
+def parts(composable):
+    """Flatten a psycopg2.sql composition into its pieces, without a connection to quote them."""
+    if isinstance(composable, sql.Composed):
+        return [part for item in composable.seq for part in parts(item)]
+    if isinstance(composable, sql.Identifier):
+        return [('identifier',) + composable.strings]
+    if isinstance(composable, sql.Placeholder):
+        return [('placeholder', composable.name)]
+    return [('sql', composable.string)]
+
+
+def identifiers(composable):
+    return [part[1:] for part in parts(composable) if part[0] == 'identifier']
+
+
+@pytest.mark.parametrize('field', [
+    'id',
+    'created_at',
+    'updated_at',
+    'unknown',
+    'name" = NULL; DROP TABLE users; --',
+    'name = name',
+    '',
+])
+def test_fields_outside_the_whitelist_are_rejected_before_any_sql(field):
+    cur = RecordingCursor()
+
+    with pytest.raises(HTTPException) as raised:
+        patch_row(cur, 'users', ROW_ID, {'name': 'Ann', field: 'x'})
+
+    assert raised.value.status_code == 400
+    assert cur.executed == []
+
+
+@pytest.mark.parametrize('body', [None, [], 'name', [['name', 'Ann']]])
+def test_a_body_that_is_not_an_object_is_rejected(body):
+    cur = RecordingCursor()
+
+    with pytest.raises(HTTPException) as raised:
+        patch_row(cur, 'users', ROW_ID, body)
+
+    assert raised.value.status_code == 400
+    assert cur.executed == []
+
+
+def test_a_column_of_another_table_is_rejected():
+    cur = RecordingCursor()
+
+    with pytest.raises(HTTPException):
+        patch_row(cur, 'categories', ROW_ID, {'surname': 'x'})
+
+    assert cur.executed == []
+
+
+@pytest.mark.parametrize('table', sorted(PATCH_COLUMNS))
+def test_only_whitelisted_columns_reach_the_update(table):
+    cur = RecordingCursor()
+    update_values = {column: 'x' for column in PATCH_COLUMNS[table]}
+
+    patch_row(cur, table, ROW_ID, update_values)
+
+    [(query, params)] = cur.executed
+    assert identifiers(query) == [(table,)] + [(column,) for column in PATCH_COLUMNS[table]]
+    assert params == {**update_values, 'row_id': ROW_ID}
+
+
+def test_values_are_sent_as_parameters_not_sql():
+    cur = RecordingCursor()
+
+    patch_row(cur, 'authors', ROW_ID, {'name': "Robert'); DROP TABLE authors; --"})
+
+    [(query, params)] = cur.executed
+    assert ('placeholder', 'name') in parts(query)
+    assert all('DROP' not in part[-1] for part in parts(query))
+    assert params['name'] == "Robert'); DROP TABLE authors; --"
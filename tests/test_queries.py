@@ -0,0 +1,72 @@
+import pytest
+
+from dbs_assignment import queries
+from dbs_assignment.queries import Query, QueryRegistry
+
+
+def test_placeholders_are_numbered_in_order_of_first_use():
+    query = Query('pair', "SELECT * FROM t WHERE a = %(a)s AND b = %(b)s OR a = %(a)s")
+
+    assert query.prepare_sql == "PREPARE pair AS SELECT * FROM t WHERE a = $1 AND b = $2 OR a = $1"
+    assert query.execute_sql == "EXECUTE pair (%(a)s, %(b)s)"
+
+
+def test_casts_are_kept_on_both_sides():
+    query = Query('by_ids', "SELECT id FROM t WHERE id = ANY(%(ids)s::uuid[]) LIMIT %(limit)s::int")
+
+    assert query.prepare_sql == "PREPARE by_ids AS SELECT id FROM t WHERE id = ANY($1::uuid[]) LIMIT $2::int"
+    assert query.execute_sql == "EXECUTE by_ids (%(ids)s::uuid[], %(limit)s::int)"
+
+
+def test_a_later_cast_types_an_uncast_parameter():
+    query = Query('ranked', "SELECT %(rank)s IS NULL OR r < %(rank)s::float8")
+
+    assert query.prepare_sql == "PREPARE ranked AS SELECT $1 IS NULL OR r < $1::float8"
+    assert query.execute_sql == "EXECUTE ranked (%(rank)s::float8)"
+
+
+def test_an_uncast_use_keeps_an_earlier_cast():
+    query = Query('ranked', "SELECT %(rank)s::float8 IS NULL OR r < %(rank)s")
+
+    assert query.prepare_sql == "PREPARE ranked AS SELECT $1::float8 IS NULL OR r < $1"
+    assert query.execute_sql == "EXECUTE ranked (%(rank)s::float8)"
+
+
+def test_escaped_percent_is_unescaped_only_in_the_prepared_body():
+    query = Query('fuzzy', "SELECT 1 WHERE %(q)s::text <%% terms AND name LIKE 'a%%'")
+
+    assert query.prepare_sql == "PREPARE fuzzy AS SELECT 1 WHERE $1::text <% terms AND name LIKE 'a%'"
+    # Unprepared connections hand the text to psycopg2, which unescapes it itself.
+    assert query.text == "SELECT 1 WHERE %(q)s::text <%% terms AND name LIKE 'a%%'"
+
+
+def test_a_statement_without_parameters_executes_bare():
+    query = Query('plain', "SELECT 1")
+
+    assert query.prepare_sql == "PREPARE plain AS SELECT 1"
+    assert query.execute_sql == "EXECUTE plain"
+
+
+def test_text_is_dedented_and_stripped():
+    query = Query('indented', """
+        SELECT 1
+        FROM t
+    """)
+
+    assert query.text == "SELECT 1\nFROM t"
+
+
+def test_a_name_registers_once():
+    registry = QueryRegistry()
+    registry.register('once', "SELECT 1")
+
+    with pytest.raises(ValueError):
+        registry.register('once', "SELECT 2")
+
+
+@pytest.mark.parametrize('name', sorted(queries.registry.stats()))
+def test_registered_statements_have_no_placeholders_left(name):
+    query = queries.registry.get(name)
+
+    assert '%(' not in query.prepare_sql
+    assert '%%' not in query.prepare_sql
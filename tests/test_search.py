@@ -0,0 +1,44 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from dbs_assignment.pagination import decode_cursor, encode_cursor
+from dbs_assignment.search import parse_search_key
+
+ROW_ID = '6c3f2948-6d49-4a35-beba-ca9ad3583b6f'
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('key', [['text', 0.25], ['fuzzy', 1]])
+def test_a_search_cursor_round_trips(key):
+    mode, rank = decode_cursor(encode_cursor(key, ROW_ID), parse_key=parse_search_key)[0]
+
+    assert (mode, rank) == (key[0], float(key[1]))
+    assert isinstance(rank, float)
+
+
+@pytest.mark.parametrize('key, row_id', [
+    (['text', True], ROW_ID),
+    (['text', False], ROW_ID),
+    (['text', '0.5'], ROW_ID),
+    (['text', None], ROW_ID),
+    (['exact', 0.5], ROW_ID),
+    ([['text'], 0.5], ROW_ID),
+    (['text'], ROW_ID),
+    (['text', 0.5, 1], ROW_ID),
+    ('text', ROW_ID),
+    (['text', 0.5], 5),
+    (['text', 0.5], ['a']),
+    (['text', 0.5], {'a': 1}),
+    (['text', 0.5], 'x'),
+])
+def test_a_malformed_search_cursor_is_a_400(key, row_id):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(raw_cursor([key, row_id]), parse_key=parse_search_key)
+
+    assert raised.value.status_code == 400